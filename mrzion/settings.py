@@ -30,6 +30,18 @@ STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
 STRIPE_PUBLIC_KEY = os.getenv('STRIPE_PUBLIC_KEY')
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 SITE_URL = os.getenv("SITE_URL")
+# Stripe API client (services/stripe_client.py). STRIPE_API_BASE points it at
+# stripe-mock (http://localhost:12111) or another fake server in development.
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE')
+STRIPE_CONNECT_TIMEOUT = float(os.getenv('STRIPE_CONNECT_TIMEOUT', 3.05))
+STRIPE_READ_TIMEOUT = float(os.getenv('STRIPE_READ_TIMEOUT', 15))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv('STRIPE_MAX_NETWORK_RETRIES', 1))
+# Consecutive outages that open the circuit breaker, and how long it stays open
+STRIPE_BREAKER_FAILURE_THRESHOLD = int(os.getenv('STRIPE_BREAKER_FAILURE_THRESHOLD', 5))
+STRIPE_BREAKER_RESET_SECONDS = float(os.getenv('STRIPE_BREAKER_RESET_SECONDS', 30))
+# Concurrent Stripe calls per process, and how long a request waits for a free slot
+STRIPE_MAX_CONCURRENT_CHECKOUTS = int(os.getenv('STRIPE_MAX_CONCURRENT_CHECKOUTS', 8))
+STRIPE_CONCURRENCY_WAIT_SECONDS = float(os.getenv('STRIPE_CONCURRENCY_WAIT_SECONDS', 2))
 
 
 # Quick-start development settings - unsuitable for production
@@ -111,6 +123,84 @@ DATABASES = {
 }
 
 
+# Django REST framework
+# orjson-backed JSON renderer/parser; swap back to rest_framework.renderers.JSONRenderer /
+# rest_framework.parsers.JSONParser to use the stock stdlib-json implementations.
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'services.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'services.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        # access_course code guesses; valid access token holders are exempt
+        'access_course_ip': os.getenv('ACCESS_COURSE_IP_RATE', '10/min'),
+        'access_course': os.getenv('ACCESS_COURSE_RATE', '30/min'),
+        # Contact, strategy call and speaker invitation submissions per IP
+        'public_forms': os.getenv('PUBLIC_FORMS_RATE', '10/hour'),
+    },
+    # Reverse proxies in front of the app. Per-IP throttles take the client address
+    # that many hops from the end of X-Forwarded-For, or REMOTE_ADDR when 0; the
+    # header is never trusted blindly, since clients can put anything in it.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 0)),
+}
+
+# Public form spam filtering: hidden field that must stay empty, and how long an
+# identical submission is treated as a duplicate
+FORM_HONEYPOT_FIELD = 'website'
+FORM_DEDUPE_SECONDS = int(os.getenv('FORM_DEDUPE_SECONDS', 60 * 10))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory by default; set REDIS_URL to share the cache between workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if os.getenv('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+
+CATALOG_CACHE_ALIAS = os.getenv('CATALOG_CACHE_ALIAS', 'default')
+# Lifetime of cached catalog entries and their version counters. LocMemCache is per
+# process, so an edit only refreshes the worker that saved it; there the other
+# workers may lag behind for at most a minute instead of a day.
+CATALOG_CACHE_TIMEOUT = int(os.getenv(
+    'CATALOG_CACHE_TIMEOUT',
+    60 if CACHES[CATALOG_CACHE_ALIAS]['BACKEND'].endswith('LocMemCache') else 60 * 60 * 24,
+))
+# How long an unknown course ID is answered with 404 without asking the database
+CATALOG_MISSING_TIMEOUT = int(os.getenv('CATALOG_MISSING_TIMEOUT', 60))
+# Serialize catalog lists straight from .values() rows instead of per-row ModelSerializers
+CATALOG_FAST_SERIALIZATION = os.getenv('CATALOG_FAST_SERIALIZATION', 'True') == 'True'
+# Static JSON snapshot of the catalog for CDN serving (`python manage.py export_catalog_snapshot`)
+CATALOG_SNAPSHOT_DIR = Path(os.getenv('CATALOG_SNAPSHOT_DIR', BASE_DIR / 'catalog_snapshot'))
+# Incrementally rebuild the snapshot whenever a book or course is saved in the admin
+CATALOG_SNAPSHOT_ON_ADMIN_SAVE = os.getenv('CATALOG_SNAPSHOT_ON_ADMIN_SAVE', 'False') == 'True'
+
+# Lifetime in seconds of the signed tokens access_course hands out
+COURSE_ACCESS_TOKEN_MAX_AGE = int(os.getenv('COURSE_ACCESS_TOKEN_MAX_AGE', 60 * 60 * 2))
+
+# create_payment Idempotency-Key handling: how long first responses are replayed,
+# and how long a duplicate waits for an in-flight original before answering 409
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 10))
+# After this long a request still marked in progress is presumed dead and a retry may
+# take its key over. Must outlast the slowest checkout (Stripe timeouts and retries).
+IDEMPOTENCY_PROCESSING_TIMEOUT = int(os.getenv('IDEMPOTENCY_PROCESSING_TIMEOUT', 120))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -171,4 +261,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL")
 
 
-SENDGRID_API_KEY= os.getenv('SENDGRID_API_KEY')
\ No newline at end of file
+SENDGRID_API_KEY= os.getenv('SENDGRID_API_KEY')
+SENDGRID_API_URL = os.getenv('SENDGRID_API_URL', 'https://api.sendgrid.com/v3/mail/send')
+SENDGRID_CONNECT_TIMEOUT = float(os.getenv('SENDGRID_CONNECT_TIMEOUT', 3.05))
+SENDGRID_READ_TIMEOUT = float(os.getenv('SENDGRID_READ_TIMEOUT', 10))
+SENDGRID_MAX_RETRIES = int(os.getenv('SENDGRID_MAX_RETRIES', 3))
+SENDGRID_POOL_SIZE = int(os.getenv('SENDGRID_POOL_SIZE', 10))
@@ -1,9 +1,36 @@
 from django.contrib import admin
-from .models import Book,Course,CourseLesson,ContactMessage,StrategyCall,SpeakerInvitation,Payment,ServicePayment,BookPayment,CoursePayment
+from django.db import transaction
+from django.utils import timezone
+from .models import Book,Course,CourseLesson,ContactMessage,StrategyCall,SpeakerInvitation,Payment,ServicePayment,BookPayment,CoursePayment,EmailOutbox,StripeEvent,IdempotencyKey
+from .stripe_events import replay_failed_events
+from .catalog_snapshot import rebuild_after_admin_change
 
 # Register your models here.
 
-admin.site.register(Book)
+class CatalogSnapshotAdminMixin:
+    """
+    Refreshes the static catalog snapshot after admin edits (CATALOG_SNAPSHOT_ON_ADMIN_SAVE).
+    Runs after save_related so inline lessons are included, and only once the change is committed.
+    """
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        transaction.on_commit(rebuild_after_admin_change)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        transaction.on_commit(rebuild_after_admin_change)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(rebuild_after_admin_change)
+
+
+@admin.register(Book)
+class BookAdmin(CatalogSnapshotAdminMixin, admin.ModelAdmin):
+    pass
+
+
 admin.site.register(ContactMessage)
 admin.site.register(StrategyCall)
 
@@ -74,8 +101,46 @@ class CourseLessonInline(admin.TabularInline):  # or admin.StackedInline for big
 
 
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
+class CourseAdmin(CatalogSnapshotAdminMixin, admin.ModelAdmin):
     list_display = ('title', 'duration', 'price', 'instructor_name', 'created_at')
     search_fields = ('title', 'description', 'instructor_name')
     list_filter = ('created_at',)
-    inlines = [CourseLessonInline]
\ No newline at end of file
+    inlines = [CourseLessonInline]
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'kind', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
+    list_filter = ('status', 'kind', 'created_at')
+    search_fields = ('recipient', 'last_error')
+    readonly_fields = ('created_at', 'sent_at', 'attempts', 'last_error')
+    ordering = ('-created_at',)
+    actions = ['requeue']
+
+    @admin.action(description="Requeue selected emails")
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(status='pending', attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f"{updated} email(s) requeued.")
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'type', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('status', 'type', 'received_at')
+    search_fields = ('event_id', 'last_error')
+    readonly_fields = ('event_id', 'type', 'stripe_created', 'payload', 'attempts', 'last_error', 'received_at', 'processed_at')
+    ordering = ('-received_at',)
+    actions = ['replay']
+
+    @admin.action(description="Replay selected failed events")
+    def replay(self, request, queryset):
+        self.message_user(request, f"{replay_failed_events(queryset)} event(s) requeued.")
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key', 'status', 'response_status', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('key',)
+    readonly_fields = ('key', 'request_fingerprint', 'status', 'response_status', 'response_body', 'created_at')
+    ordering = ('-created_at',)
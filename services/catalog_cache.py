@@ -0,0 +1,309 @@
+import gzip
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.settings import api_settings
+
+try:
+    import brotli
+except ImportError:  # without brotli only gzip is offered
+    brotli = None
+
+
+BOOKS = "books"
+COURSES = "courses"
+BUNDLE = "bundle"
+
+VERSION_KEY = "catalog:version"
+MODIFIED_KEY = "catalog:modified"
+
+# Single-flight rebuilds: how long the cross-process rebuild lock lives (in case its
+# holder dies), and how long other requests wait for the rebuild before doing it themselves
+REBUILD_LOCK_TIMEOUT = 30
+REBUILD_WAIT_SECONDS = 2.0
+REBUILD_POLL_SECONDS = 0.05
+
+_stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'coalesced': 0, 'stale': 0}
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def course_entry(course_id):
+    return f"course:{course_id}"
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def cache_stats():
+    """Hit/miss counters for this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+# --- Versions ---
+
+def _version(version_key, modified_key, timeout=None):
+    cache = get_cache()
+    values = cache.get_many([version_key, modified_key])
+    if version_key not in values or modified_key not in values:
+        now = time.time()
+        cache.add(version_key, int(now * 1000), timeout)
+        cache.add(modified_key, int(now), timeout)
+        values = cache.get_many([version_key, modified_key])
+    return values[version_key], values[modified_key]
+
+
+def _bump(version_key, modified_key, timeout=None):
+    cache = get_cache()
+    now = time.time()
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.add(version_key, int(now * 1000), timeout)
+    cache.set(modified_key, int(now), timeout)
+
+
+def catalog_version():
+    """
+    Returns (version, last_modified) for the whole catalog.
+    The counter starts from the clock in milliseconds, so a flushed, evicted or
+    expired cache never hands out an ETag that was already used for different content.
+    It expires with the entries (CATALOG_CACHE_TIMEOUT), which bounds how long a
+    worker with its own LocMemCache keeps answering 304 after an edit elsewhere.
+    """
+    return _version(VERSION_KEY, MODIFIED_KEY, timeout=settings.CATALOG_CACHE_TIMEOUT)
+
+
+def bump_catalog_version():
+    """
+    Invalidate every catalog entry at once. Entries are keyed by version,
+    so old ones are simply never read again and age out of the cache.
+    """
+    _bump(VERSION_KEY, MODIFIED_KEY, timeout=settings.CATALOG_CACHE_TIMEOUT)
+
+
+def _course_keys(course_id):
+    return f"catalog:course:{course_id}:version", f"catalog:course:{course_id}:modified"
+
+
+def course_version(course_id):
+    """
+    (version, last_modified) of a single course and its lessons, so editing one
+    course leaves every other course's cached detail alone.
+    Unlike the catalog version these keys expire, as they are created per requested ID.
+    """
+    return _version(*_course_keys(course_id), timeout=settings.CATALOG_CACHE_TIMEOUT)
+
+
+def bump_course_version(course_id):
+    """Retire the cached detail of one course and forget that it was missing."""
+    _bump(*_course_keys(course_id), timeout=settings.CATALOG_CACHE_TIMEOUT)
+    get_cache().delete(_missing_key(course_id))
+
+
+# --- Negative caching ---
+
+def _missing_key(course_id):
+    return f"catalog:course:{course_id}:missing"
+
+
+def mark_course_missing(course_id):
+    """Remember briefly that a course ID does not exist, so repeated probes skip the DB."""
+    get_cache().set(_missing_key(course_id), True, settings.CATALOG_MISSING_TIMEOUT)
+
+
+def course_missing(course_id):
+    return get_cache().get(_missing_key(course_id)) is not None
+
+
+# --- Content encodings ---
+
+def _gzip(body):
+    # mtime=0 keeps the output deterministic for a given body
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def _brotli(body):
+    return brotli.compress(body, quality=11, mode=brotli.MODE_TEXT)
+
+
+# Preferred first. Brotli is only offered when the optional package is installed.
+ENCODERS = {'br': _brotli, 'gzip': _gzip} if brotli is not None else {'gzip': _gzip}
+
+
+def choose_encoding(request):
+    """Pick the best precompressed form the client accepts, or 'identity'."""
+    accepted = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    for coding in ENCODERS:
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return 'identity'
+
+
+def encoded_variants(body):
+    """Identity plus every precompressed form, built once per catalog version."""
+    variants = {'identity': body}
+    for coding, encode in ENCODERS.items():
+        variants[coding] = encode(body)
+    return variants
+
+
+# --- Single-flight rebuilds ---
+
+# Cache key -> Event set when this process's rebuild of that key is done
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _store(cache, entry, version, build):
+    """Render `build()` once, compress it and store every variant plus the entry's latest version."""
+    key = f"catalog:{entry}:v{version}"
+    # Rendered with the project's default renderer (see REST_FRAMEWORK settings),
+    # then compressed once so requests never pay for compression
+    variants = encoded_variants(api_settings.DEFAULT_RENDERER_CLASSES[0]().render(build()))
+    values = {f"{key}:{coding}": data for coding, data in variants.items()}
+    values[f"catalog:{entry}:latest"] = version
+    cache.set_many(values, settings.CATALOG_CACHE_TIMEOUT)
+    return variants
+
+
+def _stale(cache, entry, version, encoding):
+    """The previous version of an entry, if still cached. Returns (version, body) or None."""
+    latest = cache.get(f"catalog:{entry}:latest")
+    if latest is None or latest == version:
+        return None
+    body = cache.get(f"catalog:{entry}:v{latest}:{encoding}")
+    return None if body is None else (latest, body)
+
+
+def _wait_for(cache, key, deadline, event=None):
+    """Wait for another worker to store `key`, up to `deadline`."""
+    if event is not None:
+        event.wait(max(deadline - time.monotonic(), 0))
+        return cache.get(key)
+    while time.monotonic() < deadline:
+        time.sleep(REBUILD_POLL_SECONDS)
+        body = cache.get(key)
+        if body is not None:
+            return body
+    return None
+
+
+def _fill(cache, entry, version, encoding, build):
+    """
+    Produce a missing entry with single-flight semantics. Returns (version, body, outcome).
+
+    Only one request rebuilds a given entry: threads of this process queue behind an
+    Event, other processes behind a lock taken with `cache.add`. Everyone else serves
+    the previous version if it is still cached, or waits up to REBUILD_WAIT_SECONDS for
+    the rebuild; if it has not landed by then (or failed) they build it themselves.
+    """
+    key = f"catalog:{entry}:v{version}:{encoding}"
+    with _inflight_lock:
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+
+    lock_key = f"catalog:{entry}:v{version}:lock"
+    try:
+        # In-process followers wait on the leader; the leader races other processes for the lock
+        if leader and cache.add(lock_key, True, REBUILD_LOCK_TIMEOUT):
+            try:
+                _count('misses')
+                return version, _store(cache, entry, version, build)[encoding], "MISS"
+            finally:
+                cache.delete(lock_key)
+
+        stale = _stale(cache, entry, version, encoding)
+        if stale is not None:
+            _count('stale')
+            return stale + ("STALE",)
+
+        deadline = time.monotonic() + REBUILD_WAIT_SECONDS
+        body = _wait_for(cache, key, deadline, event=None if leader else event)
+        if body is not None:
+            _count('coalesced')
+            return version, body, "COALESCED"
+
+        _count('misses')
+        return version, _store(cache, entry, version, build)[encoding], "MISS"
+    finally:
+        if leader:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+            event.set()
+
+
+# --- Responses ---
+
+def cached_response(request, entry, build, version=None):
+    """
+    Serve a catalog entry with conditional GET support.
+
+    A matching If-None-Match / If-Modified-Since is answered with 304 from the
+    version counter alone. Otherwise the rendered JSON bytes are served from the
+    cache, or rebuilt once by `build()` (see `_fill`) and stored.
+    Exceptions from `build()` (e.g. DoesNotExist) propagate and nothing is cached.
+    `version` is a (version, last_modified) pair and defaults to the catalog version.
+    """
+    version, last_modified = version or catalog_version()
+    encoding = choose_encoding(request)
+    suffix = "" if encoding == 'identity' else f"-{encoding}"
+
+    validators = HttpResponse(content_type="application/json")
+    # Each encoding is a different representation, so it gets its own strong ETag
+    validators["ETag"] = f'"{entry}-{version}{suffix}"'
+    validators["Last-Modified"] = http_date(last_modified)
+    # Let browsers keep the payload but revalidate it on every navigation
+    validators["Cache-Control"] = "no-cache"
+    validators["Vary"] = "Accept-Encoding"
+
+    not_modified = get_conditional_response(
+        request, etag=validators["ETag"], last_modified=last_modified, response=validators
+    )
+    if not_modified is not validators:
+        _count('not_modified')
+        return not_modified
+
+    cache = get_cache()
+    body = cache.get(f"catalog:{entry}:v{version}:{encoding}")
+
+    if body is None:
+        served, body, outcome = _fill(cache, entry, version, encoding, build)
+        if served != version:
+            # Stale content must not carry the current validators
+            validators["ETag"] = f'"{entry}-{served}{suffix}"'
+            del validators["Last-Modified"]
+    else:
+        _count('hits')
+        outcome = "HIT"
+
+    response = validators
+    response.content = body
+    if encoding != 'identity':
+        response["Content-Encoding"] = encoding
+    response["X-Cache"] = outcome
+    return response
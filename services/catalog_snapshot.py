@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.settings import api_settings
+
+from .models import Book, Course, CourseLesson, StripeCatalogItem
+from .serializers import BookSerializer, CourseSerializer, CoursePublicDetailSerializer
+
+
+MANIFEST_NAME = "manifest.json"
+
+BOOKS_PATH = "/api/books/"
+COURSES_PATH = "/api/courses/"
+
+# Admin saves can overlap; one rebuild at a time per process is plenty
+_rebuild_lock = threading.Lock()
+
+
+def course_path(course_id):
+    return f"/api/courses/{course_id}/"
+
+
+def _fingerprint(rows):
+    """Stable digest of the source rows behind one file."""
+    return hashlib.sha256(repr(rows).encode()).hexdigest()
+
+
+def _rows(queryset):
+    """Rows of every published column, primary key first. Stripe bookkeeping and access codes are left out."""
+    internal = {field.attname for field in StripeCatalogItem._meta.fields} | {'access_code'}
+    model = queryset.model
+    columns = [field.attname for field in model._meta.concrete_fields if field.attname not in internal]
+    columns.remove(model._meta.pk.attname)
+    return list(queryset.order_by('pk').values_list(model._meta.pk.attname, *columns))
+
+
+def source_fingerprints():
+    """
+    Fingerprint every snapshot file from its source rows in three queries,
+    without serializing anything. Returns {url path: fingerprint}.
+    """
+    lessons = defaultdict(list)
+    # Only the outline is published, so video and resource edits leave the snapshot alone
+    for row in CourseLesson.objects.values_list('course_id', 'id', 'title', 'order').order_by('course_id', 'order', 'id'):
+        lessons[row[0]].append(row)
+
+    courses = _rows(Course.objects.all())
+    fingerprints = {
+        BOOKS_PATH: _fingerprint(_rows(Book.objects.all())),
+        # The list only shows lesson counts, so editing a lesson's title leaves it alone
+        COURSES_PATH: _fingerprint([(row, len(lessons[row[0]])) for row in courses]),
+    }
+    for row in courses:
+        fingerprints[course_path(row[0])] = _fingerprint((row, lessons[row[0]]))
+    return fingerprints
+
+
+def render(data):
+    """Same bytes the API serves (see REST_FRAMEWORK's default renderer)."""
+    return api_settings.DEFAULT_RENDERER_CLASSES[0]().render(data)
+
+
+def build_payloads(paths):
+    """
+    Render only the requested url paths. Returns {url path: bytes}.
+    Course files hold the public detail, never the access code or lesson videos.
+    """
+    payloads = {}
+    if BOOKS_PATH in paths:
+        payloads[BOOKS_PATH] = render(BookSerializer(Book.objects.order_by('-created_at'), many=True).data)
+    if COURSES_PATH in paths:
+        courses = Course.objects.with_lessons_count().order_by('-created_at')
+        payloads[COURSES_PATH] = render(CourseSerializer(courses, many=True).data)
+
+    course_ids = [path.split('/')[-2] for path in paths if path not in (BOOKS_PATH, COURSES_PATH)]
+    if course_ids:
+        for course in Course.objects.prefetch_related('lessons').filter(id__in=course_ids):
+            payloads[course_path(course.id)] = render(CoursePublicDetailSerializer(course).data)
+    return payloads
+
+
+def file_name(path, body):
+    """Content-addressed name, e.g. `courses/COURSE-AB12CD34.3f9a1c2e7b4d.json`, so CDNs can cache forever."""
+    digest = hashlib.sha256(body).hexdigest()[:12]
+    name = path[len("/api/"):].strip('/')
+    return f"{name}.{digest}.json"
+
+
+def load_manifest(output_dir):
+    try:
+        with open(Path(output_dir) / MANIFEST_NAME) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'version': 0, 'files': {}}
+
+
+def _write(target, data):
+    # Write to a temp file and rename, so the CDN origin never serves a half-written file
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, target)
+
+
+def export_snapshot(output_dir=None, force=False):
+    """
+    Bring the snapshot in `output_dir` up to date with the database.
+
+    Only files whose source rows changed since the last run (per the fingerprints
+    stored in the manifest) are re-rendered. Files for deleted courses and
+    superseded versions are removed after the new manifest is in place.
+    Returns (rebuilt paths, removed paths).
+    """
+    output_dir = Path(output_dir or settings.CATALOG_SNAPSHOT_DIR)
+    previous = load_manifest(output_dir)
+    old_files = previous['files']
+    fingerprints = source_fingerprints()
+
+    stale = [
+        path for path, fingerprint in fingerprints.items()
+        if force or old_files.get(path, {}).get('source') != fingerprint
+    ]
+    removed = sorted(set(old_files) - set(fingerprints))
+    if not stale and not removed:
+        return [], []
+
+    files = {path: entry for path, entry in old_files.items() if path in fingerprints}
+    for path, body in build_payloads(stale).items():
+        name = file_name(path, body)
+        _write(output_dir / name, body)
+        files[path] = {'file': name, 'source': fingerprints[path], 'bytes': len(body)}
+
+    manifest = {
+        'version': previous['version'] + 1,
+        'generated_at': timezone.now().isoformat(),
+        'files': dict(sorted(files.items())),
+    }
+    _write(output_dir / MANIFEST_NAME, json.dumps(manifest, indent=2).encode())
+
+    # Drop files the new manifest no longer points at
+    live = {entry['file'] for entry in files.values()}
+    for entry in old_files.values():
+        if entry['file'] not in live:
+            (output_dir / entry['file']).unlink(missing_ok=True)
+
+    return sorted(stale), removed
+
+
+def rebuild_after_admin_change():
+    """Incremental rebuild triggered from the admin; never lets a snapshot problem break the save."""
+    if not settings.CATALOG_SNAPSHOT_ON_ADMIN_SAVE:
+        return
+    try:
+        with _rebuild_lock:
+            rebuilt, removed = export_snapshot()
+        if rebuilt or removed:
+            print(f"📦 Catalog snapshot updated: {len(rebuilt)} rebuilt, {len(removed)} removed")
+    except Exception as e:
+        print(f"❌ Catalog snapshot rebuild failed: {e}")
@@ -0,0 +1,235 @@
+import html
+import keyword
+import re
+
+
+_SLOT = re.compile(r"\{\{\s*(\w+)(\|safe)?\s*\}\}")
+
+
+class EmailTemplate:
+    """
+    A tiny precompiled template.
+    The source is compiled once into a Python function that escapes each slot once and
+    returns a single f-string, so rendering costs what the old hand-written f-strings
+    did plus the escaping. Values are HTML-escaped unless the slot is marked
+    `{{ slot|safe }}` or the template was built with autoescape=False.
+    Context keys without a slot are ignored.
+    """
+
+    def __init__(self, source, autoescape=True):
+        self.slots = []
+        assignments = []
+        chunks = []
+
+        position = 0
+        for match in _SLOT.finditer(source):
+            name, escape = match.group(1), autoescape and not match.group(2)
+            if not name.isidentifier() or keyword.iskeyword(name) or name.startswith('_'):
+                raise ValueError(f"Invalid template slot name: {name!r}")
+            if name not in self.slots:
+                self.slots.append(name)
+            variable = f"_{name}_{'escaped' if escape else 'raw'}"
+            assignment = f"{variable} = _escape(str({name}))" if escape else f"{variable} = str({name})"
+            if assignment not in assignments:
+                assignments.append(assignment)
+            chunks.append(_literal(source[position:match.start()]))
+            chunks.append(f"{{{variable}}}")
+            position = match.end()
+        chunks.append(_literal(source[position:]))
+
+        parameters = "".join(f"{name}, " for name in self.slots)
+        code = (
+            f"def render({'*, ' + parameters if parameters else ''}**_unused):\n"
+            + "".join(f"    {assignment}\n" for assignment in assignments)
+            + f"    return f{''.join(chunks)!r}\n"
+        )
+        namespace = {'_escape': html.escape}
+        exec(code, namespace)
+        self.render = namespace['render']
+
+
+def _literal(text):
+    """Template text as it must appear inside an f-string."""
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def compose(layout, **blocks):
+    """Inline static blocks into a layout source before it is compiled."""
+    for name, block in blocks.items():
+        layout = _SLOT.sub(lambda match: block if match.group(1) == name else match.group(0), layout)
+    return layout
+
+
+# --- Shared layout ---
+
+_LAYOUT = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <meta name="viewport" content="width=device-width, initial-scale=1.0">
+            <title>{{ heading }}</title>
+        </head>
+        <body style="margin:0;padding:0;font-family:Arial,sans-serif;background-color:#f4f8f4;">
+            <table align="center" width="100%" cellpadding="0" cellspacing="0"
+                style="max-width:600px;background-color:#ffffff;border-radius:10px;overflow:hidden;
+                       box-shadow:0 2px 12px rgba(0,0,0,0.1);">
+                <tr>
+                    <td style="background-color:#2563eb;padding:25px;text-align:center;color:#fff;
+                               font-size:28px;font-weight:bold;">
+                        {{ brand }}
+                    </td>
+                </tr>
+                <tr>
+                    <td style="padding:40px 30px;text-align:center;color:#333;">
+                        <h2 style="color:#2563eb;">{{ heading }}</h2>
+                        <p style="font-size:16px;">Hi {{ full_name }},</p>
+                        {{ body|safe }}
+                    </td>
+                </tr>
+                <tr>
+                    <td style="padding:20px;background-color:#f6f6f6;text-align:center;
+                               font-size:13px;color:#777;">
+                        For any questions, contact
+                        <a href="mailto:mrzion.noreply@gmail.com" style="color:#2563eb;">mrzion.noreply@gmail.com</a><br><br>
+                        &copy; 2025 MrZion. All rights reserved.
+                    </td>
+                </tr>
+            </table>
+        </body>
+        </html>
+        """
+
+
+# --- Course ---
+
+COURSE_HTML = EmailTemplate(compose(
+    _LAYOUT,
+    brand="MrZion Courses",
+    heading="Payment Successful 🎉",
+    body="""
+                        <p style="font-size:16px;">
+                            Your payment for <strong>{{ course_title }}</strong> has been successfully confirmed.
+                        </p>
+
+                        <div style="margin:25px 0;background-color:#f4f8f4;border-radius:8px;padding:20px;">
+                            <p><strong>Access Code:</strong>
+                                <span style="font-size:18px;font-weight:bold;color:#2563eb;">{{ access_code }}</span>
+                            </p>
+                            <p><strong>Course Link:</strong>
+                                <a href="{{ course_link }}" style="color:#2563eb;">{{ course_link }}</a>
+                            </p>
+                        </div>
+
+                        <a href="{{ course_link }}"
+                            style="display:inline-block;margin-top:25px;background-color:#2563eb;color:#ffffff;text-decoration:none;
+                            padding:14px 32px;border-radius:6px;font-weight:bold;font-size:16px;">
+                            Access Your Course
+                        </a>"""
+))
+
+COURSE_TEXT = EmailTemplate("""
+Hi {{ full_name }},
+
+Your payment for "{{ course_title }}" has been confirmed successfully.
+
+Here are your access details:
+Access Code: {{ access_code }}
+Course Link: {{ course_link }}
+
+You can now begin your course and start learning right away!
+
+Thank you for choosing MrZion.
+""", autoescape=False)
+
+
+# --- Service ---
+
+SERVICE_HTML = EmailTemplate(compose(
+    _LAYOUT,
+    brand="MrZion Services",
+    heading="Payment Received 💼",
+    body="""
+                        <p style="font-size:16px;">
+                            We’ve received your payment for the service <strong>{{ service_name }}</strong>.
+                        </p>
+                        <p style="font-size:16px;">
+                            Our team will reach out to you shortly to proceed with your request.
+                        </p>
+                        <p style="margin-top:30px;">Thank you for trusting <strong>MrZion</strong>!</p>"""
+))
+
+SERVICE_TEXT = EmailTemplate("""
+Hi {{ full_name }},
+
+Your payment for the service "{{ service_name }}" has been received successfully.
+
+Our team will contact you shortly to proceed with the next steps.
+
+Thank you for choosing MrZion.
+""", autoescape=False)
+
+
+# --- Book ---
+
+BOOK_LINK_HTML = EmailTemplate(
+    '<p><strong>{{ label }}:</strong> <a href="{{ url }}" style="color:#2563eb;">{{ url }}</a></p>'
+)
+
+BOOK_HTML = EmailTemplate(compose(
+    _LAYOUT,
+    brand="MrZion Store",
+    heading="Payment Successful 📚",
+    body="""
+                        <p style="font-size:16px;">Your payment for <strong>{{ book_title }}</strong> has been confirmed.</p>
+                        <p style="font-size:16px;">Here are your book links:</p>
+                        {{ links|safe }}
+                        <p style="margin-top:30px;">Enjoy your reading, and thank you for supporting <strong>MrZion</strong>!</p>"""
+))
+
+BOOK_TEXT = EmailTemplate("""
+Hi {{ full_name }},
+
+Your payment for "{{ book_title }}" has been confirmed successfully.
+
+Here are your book access links:
+{{ links }}
+
+Thank you for choosing MrZion.
+""", autoescape=False)
+
+
+def render_course_payment_email(full_name, course_title, access_code, course_link):
+    """Returns (subject, text_content, html_content)."""
+    context = {
+        'full_name': full_name,
+        'course_title': course_title,
+        'access_code': access_code,
+        'course_link': course_link,
+    }
+    return f"Payment Confirmed for {course_title} 🎉", COURSE_TEXT.render(**context), COURSE_HTML.render(**context)
+
+
+def render_service_payment_email(full_name, service_name):
+    """Returns (subject, text_content, html_content)."""
+    context = {'full_name': full_name, 'service_name': service_name}
+    return f"Service Payment Received – {service_name}", SERVICE_TEXT.render(**context), SERVICE_HTML.render(**context)
+
+
+def render_book_payment_email(full_name, book_title, book_links):
+    """
+    Returns (subject, text_content, html_content).
+    book_links: dict like {"Kindle": "...", "Paperback": "...", "PDF": "..."}
+    """
+    links = [(label, url) for label, url in book_links.items() if url]
+    html_content = BOOK_HTML.render(
+        full_name=full_name,
+        book_title=book_title,
+        links="".join(BOOK_LINK_HTML.render(label=label, url=url) for label, url in links),
+    )
+    text_content = BOOK_TEXT.render(
+        full_name=full_name,
+        book_title=book_title,
+        links="\n".join(f"{label}: {url}" for label, url in links),
+    )
+    return f"Payment Confirmed for {book_title} 📚", text_content, html_content
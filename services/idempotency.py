@@ -0,0 +1,127 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+HEADER = "HTTP_IDEMPOTENCY_KEY"
+# Stripe's limit; it applies to the scoped key "<scope>:<client key>" we forward
+MAX_KEY_LENGTH = 255
+POLL_SECONDS = 0.1
+
+
+def fingerprint(data):
+    """Digest of the request body, to catch a key reused for a different request."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def claim(key, request_fingerprint):
+    """
+    Insert the key as 'processing'. Returns (record, created); the unique
+    constraint makes exactly one concurrent request the owner.
+    Records older than IDEMPOTENCY_KEY_TTL are expired and can be claimed again.
+
+    A record still 'processing' after IDEMPOTENCY_PROCESSING_TIMEOUT belongs to a
+    worker that died mid-request, and a retry of the same request takes it over.
+    That is safe because the key is forwarded to Stripe, which returns the session
+    the first attempt created, if it got that far.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    IdempotencyKey.objects.filter(key=key, created_at__lt=cutoff).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(key=key, request_fingerprint=request_fingerprint), True
+    except IntegrityError:
+        record = IdempotencyKey.objects.get(key=key)
+
+    lease_cutoff = now - timedelta(seconds=settings.IDEMPOTENCY_PROCESSING_TIMEOUT)
+    if record.status == 'processing' and record.created_at < lease_cutoff and \
+            record.request_fingerprint == request_fingerprint:
+        # Conditional on the old lease, so only one of several retries takes over
+        taken = IdempotencyKey.objects.filter(
+            pk=record.pk, status='processing', created_at=record.created_at
+        ).update(created_at=now)
+        if taken:
+            record.created_at = now
+            return record, True
+    return record, False
+
+
+def owned(record):
+    """The record, as long as its lease was not taken over by a retry."""
+    return IdempotencyKey.objects.filter(pk=record.pk, status='processing', created_at=record.created_at)
+
+
+def wait_for_completion(record):
+    """Poll until the owning request stores its response, up to IDEMPOTENCY_WAIT_SECONDS."""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while record.status == 'processing' and time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None:  # the owner failed and released the key
+            return None
+    return record
+
+
+def idempotent_response(request, scope, handler):
+    """
+    Run `handler(key)` at most once per `Idempotency-Key` header within IDEMPOTENCY_KEY_TTL.
+
+    Retries get the stored first response (with `Idempotent-Replayed: true`). A retry that
+    arrives while the first request is still running waits for it rather than racing it;
+    one whose original died without an answer takes over after IDEMPOTENCY_PROCESSING_TIMEOUT.
+    Only successful responses are stored: create_payment reports Stripe outages as
+    errors too, and a retry with the same key must be able to get past them.
+    Without the header the handler simply runs, with key None.
+    """
+    client_key = request.META.get(HEADER)
+    if not client_key:
+        return handler(None)
+    if len(client_key) > MAX_KEY_LENGTH - len(scope) - 1:
+        return Response({'error': 'Idempotency-Key is too long.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    key = f"{scope}:{client_key}"
+    request_fingerprint = fingerprint(request.data)
+    record, created = claim(key, request_fingerprint)
+
+    if not created:
+        if record.request_fingerprint != request_fingerprint:
+            return Response(
+                {'error': 'Idempotency-Key was already used for a different request.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        record = wait_for_completion(record)
+        if record is None:
+            return idempotent_response(request, scope, handler)
+        if record.status == 'processing':
+            response = Response(
+                {'error': 'A request with this Idempotency-Key is still in progress.'},
+                status=status.HTTP_409_CONFLICT
+            )
+            response['Retry-After'] = '1'
+            return response
+        response = Response(record.response_body, status=record.response_status)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    try:
+        response = handler(key)
+    except Exception:
+        owned(record).delete()
+        raise
+
+    # Writes are conditional on the lease: if a retry took the key over meanwhile, it owns the record
+    if not status.is_success(response.status_code):
+        owned(record).delete()
+    else:
+        owned(record).update(status='completed', response_status=response.status_code, response_body=response.data)
+    return response
@@ -0,0 +1,95 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from services.models import Book, Course, CourseLesson
+from services.serializers import BookSerializer, CourseSerializer, ValuesListSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+def best_of(repeats, func):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def seed_catalog(rows):
+    """Bulk-create `rows` books and courses (3 lessons each) for benchmarking."""
+    Book.objects.bulk_create([
+        Book(
+            title=f"Benchmark Book {i}", subtitle="A subtitle", description="Lorem ipsum " * 40,
+            cover_image="https://example.com/cover.png", price="19.99",
+            ideal_for="Founders", what_readers_will_learn=["Governance", "Funding", "Impact"],
+        )
+        for i in range(rows)
+    ])
+    courses = [
+        Course(
+            id=f"COURSE-B{i:07d}", title=f"Benchmark Course {i}", description="Lorem ipsum " * 40,
+            duration="6 weeks", price="149.00", thumbnail="https://example.com/thumb.png",
+            what_you_learn=["Strategy"], access_code=f"BENCH{i:015d}",
+        )
+        for i in range(rows)
+    ]
+    Course.objects.bulk_create(courses)
+    CourseLesson.objects.bulk_create([
+        CourseLesson(course=course, title=f"Lesson {n}", video_url="https://example.com/v", order=n)
+        for course in courses for n in range(3)
+    ])
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows/second of the ModelSerializer and .values() serialization paths "
+        "for the catalog lists. Sample rows are created in a transaction and rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500)
+        parser.add_argument('--repeats', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                seed_catalog(options['rows'])
+                self.run(options['rows'], options['repeats'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, rows, repeats):
+        renderer = JSONRenderer()
+        cases = [
+            ("books", Book.objects.all(), BookSerializer),
+            ("courses", Course.objects.with_lessons_count(), CourseSerializer),
+        ]
+
+        for name, queryset, serializer_class in cases:
+            queryset = queryset.order_by('-created_at')
+
+            def model_serializer():
+                return renderer.render(serializer_class(queryset.all(), many=True).data)
+
+            def values_serializer():
+                fast = ValuesListSerializer(serializer_class)
+                return renderer.render(fast.to_representation(fast.values(queryset.all())))
+
+            slow_time, slow_body = best_of(repeats, model_serializer)
+            fast_time, fast_body = best_of(repeats, values_serializer)
+            if slow_body != fast_body:
+                raise CommandError(f"{name}: fast path output differs from ModelSerializer output")
+
+            total = queryset.count()
+            self.stdout.write(
+                f"{name:<8} ModelSerializer {total / slow_time:10.0f} rows/s   "
+                f".values() {total / fast_time:10.0f} rows/s   "
+                f"speedup x{slow_time / fast_time:.1f}   (byte-identical)"
+            )
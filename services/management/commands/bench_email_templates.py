@@ -0,0 +1,128 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from services.email_templates import render_course_payment_email
+
+
+def legacy_course_payment_email(full_name, course_title, access_code, course_link):
+    """The original f-string rendering, kept only as the benchmark baseline."""
+    subject = f"Payment Confirmed for {course_title} 🎉"
+
+    # Plain text fallback
+    text_content = f"""
+Hi {full_name},
+
+Your payment for "{course_title}" has been confirmed successfully.
+
+Here are your access details:
+Access Code: {access_code}
+Course Link: {course_link}
+
+You can now begin your course and start learning right away!
+
+Thank you for choosing MrZion.
+"""
+
+    # HTML version
+    html_content = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Payment Successful</title>
+    </head>
+    <body style="margin:0; padding:0; font-family: Arial, sans-serif; background-color:#f4f8f4;">
+        <table align="center" width="100%" cellpadding="0" cellspacing="0"
+            style="max-width:600px; background-color:#ffffff; border-radius:10px; overflow:hidden; box-shadow:0 2px 12px rgba(0,0,0,0.1);">
+
+            <tr>
+                <td style="background-color:#2563eb; padding:25px; text-align:center; color:#ffffff; font-size:28px; font-weight:bold;">
+                    MrZion Courses
+                </td>
+            </tr>
+
+            <tr>
+                <td style="padding:40px 30px; text-align:center; color:#333333;">
+                    <h2 style="color:#2563eb;">Payment Successful 🎉</h2>
+                    <p style="font-size:16px;">Hi {full_name},</p>
+                    <p style="font-size:16px;">
+                        Your payment for <strong>{course_title}</strong> has been successfully confirmed.
+                    </p>
+
+                    <div style="margin:25px 0; background-color:#f4f8f4; border-radius:8px; padding:20px;">
+                        <p><strong>Access Code:</strong>
+                            <span style="font-size:18px; font-weight:bold; color:#2563eb;">{access_code}</span>
+                        </p>
+                        <p><strong>Course Link:</strong>
+                            <a href="{course_link}" style="color:#2563eb;">{course_link}</a>
+                        </p>
+                    </div>
+
+                    <a href="{course_link}"
+                        style="display:inline-block; margin-top:25px; background-color:#2563eb; color:#ffffff; text-decoration:none;
+                        padding:14px 32px; border-radius:6px; font-weight:bold; font-size:16px;">
+                        Access Your Course
+                    </a>
+                </td>
+            </tr>
+
+            <tr>
+                <td style="padding:20px; background-color:#f6f6f6; text-align:center; font-size:13px; color:#777;">
+                    If you have any issues, contact 
+                    <a href="mailto:mrzion.noreply@gmail.com" style="color:#2563eb;">smrzion.noreply@gmail.com</a><br><br>
+                    &copy; 2025 MrZion. All rights reserved.
+                </td>
+            </tr>
+        </table>
+    </body>
+    </html>
+    """
+    return subject, text_content, html_content
+
+
+SAMPLE = {
+    'full_name': "Ada O'Neil",
+    'course_title': "NGO Foundations & Growth",
+    'access_code': "A1B2C3D4E5F6G7H8I9J0",
+    'course_link': "https://zionoshiobugie.com/courses/owned/COURSE-ABCD1234",
+}
+
+
+def measure(render, iterations):
+    """Returns (microseconds per email, peak bytes allocated while rendering one email)."""
+    # Best of five runs keeps scheduler noise out of the comparison
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            render(**SAMPLE)
+        timings.append(time.perf_counter() - start)
+    elapsed = min(timings)
+
+    tracemalloc.start()
+    render(**SAMPLE)
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    render(**SAMPLE)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return elapsed / iterations * 1e6, peak
+
+
+class Command(BaseCommand):
+    help = "Compare per-email render time and allocations of the precompiled templates against the old f-string helpers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        results = [
+            ("f-string (legacy)", measure(legacy_course_payment_email, iterations)),
+            ("precompiled template", measure(render_course_payment_email, iterations)),
+        ]
+        for name, (micros, allocated) in results:
+            self.stdout.write(f"{name:<22} {micros:8.2f} us/email {allocated:8d} B peak/email")
@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from services.models import Book, Course
+from services.renderers import ORJSONRenderer
+from services.serializers import BookSerializer, CourseSerializer, CourseDetailSerializer
+from .bench_catalog_serialization import Rollback, best_of, seed_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the stock JSONRenderer with ORJSONRenderer on the real catalog payloads. "
+        "Sample rows are created in a transaction and rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200)
+        parser.add_argument('--repeats', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                seed_catalog(options['rows'])
+                self.run(options['repeats'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, repeats):
+        course = Course.objects.prefetch_related('lessons').first()
+        now = timezone.now()
+        payloads = [
+            ("books", BookSerializer(Book.objects.order_by('-created_at'), many=True).data),
+            ("courses", CourseSerializer(Course.objects.with_lessons_count().order_by('-created_at'), many=True).data),
+            ("course_detail", CourseDetailSerializer(course).data),
+            # Raw Decimal/datetime values, as views returning plain dicts would produce
+            ("payments (raw)", [
+                {'id': i, 'amount': Decimal('149.00') * i, 'status': 'success', 'created_at': now}
+                for i in range(1000)
+            ]),
+        ]
+
+        stock, fast = JSONRenderer(), ORJSONRenderer()
+        for name, data in payloads:
+            stock_time, stock_body = best_of(repeats, lambda: stock.render(data))
+            fast_time, fast_body = best_of(repeats, lambda: fast.render(data))
+            if stock_body != fast_body:
+                raise CommandError(f"{name}: orjson output differs from the stock renderer")
+
+            self.stdout.write(
+                f"{name:<16} {len(stock_body):>8} B   json {stock_time * 1e3:8.3f} ms   "
+                f"orjson {fast_time * 1e3:8.3f} ms   speedup x{stock_time / fast_time:.1f}   (byte-identical)"
+            )
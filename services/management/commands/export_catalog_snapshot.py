@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from services.catalog_snapshot import export_snapshot, MANIFEST_NAME
+
+
+class Command(BaseCommand):
+    help = (
+        "Render /api/books/, /api/courses/ and every course detail to versioned JSON files "
+        "plus a manifest, for serving the catalog from a CDN. Only files whose source rows "
+        "changed since the last run are rebuilt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Snapshot directory (defaults to CATALOG_SNAPSHOT_DIR).")
+        parser.add_argument('--force', action='store_true', help="Re-render every file even if its rows are unchanged.")
+
+    def handle(self, *args, **options):
+        rebuilt, removed = export_snapshot(options['output'], force=options['force'])
+
+        for path in rebuilt:
+            self.stdout.write(f"rebuilt {path}")
+        for path in removed:
+            self.stdout.write(f"removed {path}")
+
+        if rebuilt or removed:
+            self.stdout.write(self.style.SUCCESS(f"Snapshot updated: {len(rebuilt)} rebuilt, {len(removed)} removed, see {MANIFEST_NAME}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Snapshot already up to date"))
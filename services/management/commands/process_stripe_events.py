@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from services.stripe_events import process_pending_events, replay_failed_events
+
+
+class Command(BaseCommand):
+    help = "Apply queued Stripe webhook events in order and in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--replay-failed', action='store_true', help="Requeue failed events before processing.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when the inbox is drained.")
+        parser.add_argument('--sleep', type=float, default=1.0, help="Seconds to wait between polls when idle (with --loop).")
+
+    def handle(self, *args, **options):
+        if options['replay_failed']:
+            self.stdout.write(f"Requeued {replay_failed_events()} failed event(s)")
+
+        batch_size = options['batch_size']
+        total_processed = total_failed = 0
+
+        while True:
+            processed, failed = process_pending_events(batch_size=batch_size)
+            total_processed += processed
+            total_failed += failed
+
+            if processed or failed:
+                self.stdout.write(f"Batch done: {processed} processed, {failed} failed")
+
+            # A full batch means there is probably more work waiting
+            if processed + failed >= batch_size:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Inbox drained: {total_processed} processed, {total_failed} failed"))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from services.outbox import deliver_due_emails, MAX_ATTEMPTS
+
+
+class Command(BaseCommand):
+    help = "Deliver queued emails from the outbox in batches, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when the outbox is drained.")
+        parser.add_argument('--sleep', type=float, default=5.0, help="Seconds to wait between polls when idle (with --loop).")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total_sent = total_failed = 0
+
+        while True:
+            sent, failed = deliver_due_emails(batch_size=batch_size, max_attempts=options['max_attempts'])
+            total_sent += sent
+            total_failed += failed
+
+            if sent or failed:
+                self.stdout.write(f"Batch done: {sent} sent, {failed} failed")
+
+            # A full batch means there is probably more work waiting
+            if sent + failed >= batch_size:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Outbox drained: {total_sent} sent, {total_failed} failed"))
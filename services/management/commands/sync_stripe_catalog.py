@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from services.models import Book, Course
+from services.stripe_catalog import is_synced, sync_item
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update the Stripe Product/Price of every book and course whose title "
+        "or price changed since the last sync. Checkout also syncs items lazily; this "
+        "just does it ahead of time."
+    )
+
+    def handle(self, *args, **options):
+        synced = unchanged = 0
+        for model in (Book, Course):
+            for item in model.objects.order_by('pk'):
+                if is_synced(item):
+                    unchanged += 1
+                    continue
+                price_id = sync_item(item)
+                synced += 1
+                self.stdout.write(f"{model._meta.model_name} {item.pk}: {price_id}")
+
+        self.stdout.write(self.style.SUCCESS(f"Stripe catalog synced: {synced} updated, {unchanged} unchanged"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0020_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='payment_id',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
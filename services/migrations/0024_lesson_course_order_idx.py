@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0023_catalog_created_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='courselesson',
+            index=models.Index(fields=['course', 'order'], name='lesson_course_order_idx'),
+        ),
+    ]
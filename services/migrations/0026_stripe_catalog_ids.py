@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0025_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='stripe_price_id',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='stripe_product_id',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='stripe_synced_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='stripe_synced_title',
+            field=models.CharField(blank=True, editable=False, max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='stripe_price_id',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='stripe_product_id',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='stripe_synced_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='stripe_synced_title',
+            field=models.CharField(blank=True, editable=False, max_length=200, null=True),
+        ),
+    ]
@@ -1,9 +1,24 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from .utils import generate_course_id
 
 # Create your models here.
 
-class Book(models.Model):
+class StripeCatalogItem(models.Model):
+    """
+    Stripe Product/Price mirrored for a catalog item, plus the title and price they
+    were created from, so they are only re-synced when those change (services/stripe_catalog.py).
+    """
+    stripe_product_id = models.CharField(max_length=255, blank=True, null=True, editable=False)
+    stripe_price_id = models.CharField(max_length=255, blank=True, null=True, editable=False)
+    stripe_synced_title = models.CharField(max_length=200, blank=True, null=True, editable=False)
+    stripe_synced_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+
+class Book(StripeCatalogItem):
     title = models.CharField(max_length=200)
     subtitle = models.CharField(max_length=255, blank=True, null=True)
     description = models.TextField()
@@ -18,11 +33,22 @@ class Book(models.Model):
     what_readers_will_learn = models.JSONField(blank=True, null=True) 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='book_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
 
-class Course(models.Model):
+class CourseQuerySet(models.QuerySet):
+    def with_lessons_count(self):
+        """Annotate `lessons_count` so lists don't run one COUNT query per course."""
+        return self.annotate(lessons_count=models.Count('lessons'))
+
+
+class Course(StripeCatalogItem):
     id = models.CharField(
         primary_key=True,
         max_length=20,
@@ -42,6 +68,12 @@ class Course(models.Model):
     access_code = models.CharField(max_length=20, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CourseQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='course_created_idx'),
+        ]
     
 
     def save(self, *args, **kwargs):
@@ -66,6 +98,10 @@ class CourseLesson(models.Model):
 
     class Meta:
         ordering = ["order"]
+        indexes = [
+            # Outline listing filters on course and sorts by order
+            models.Index(fields=['course', 'order'], name='lesson_course_order_idx'),
+        ]
 
     def __str__(self):
         return f"{self.course.title} - {self.title}"
@@ -149,6 +185,26 @@ class SpeakerInvitation(models.Model):
     
 
 
+class PaymentQuerySet(models.QuerySet):
+    def transition(self, payment_id, status):
+        """
+        Move a payment to `status` with one conditional UPDATE on the indexed payment_id.
+        Returns True only if a row actually changed, so duplicate Stripe deliveries are no-ops.
+        A change to 'success' queues the confirmation email in the same transaction.
+        """
+        from .outbox import enqueue_payment_success_email
+
+        with transaction.atomic():
+            changed = self.filter(
+                payment_id=payment_id,
+                status__in=Payment.ALLOWED_TRANSITIONS[status],
+            ).update(status=status) > 0
+
+            if changed and status == 'success':
+                enqueue_payment_success_email(self.get(payment_id=payment_id))
+        return changed
+
+
 class Payment(models.Model):
     PAYMENT_TYPE_CHOICES = [
         ('service', 'Service'),
@@ -164,11 +220,46 @@ class Payment(models.Model):
     item_name = models.CharField(max_length=200)  # name of the service/book/course
     qty=models.IntegerField(default=1)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    payment_id = models.CharField(max_length=255, blank=True, null=True)
+    payment_id = models.CharField(max_length=255, blank=True, null=True, unique=True)
     status = models.CharField(max_length=20, default="pending")
     satisfied=models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Statuses each target status may be reached from by a webhook transition.
+    # A late success still wins over an expiry/failure; nothing moves a successful payment.
+    ALLOWED_TRANSITIONS = {
+        'success': ['pending', 'expired', 'failed'],
+        'expired': ['pending'],
+        'failed': ['pending'],
+    }
+
+    objects = PaymentQuerySet.as_manager()
+
+    # Status as last read from / written to the database; None for unsaved payments and
+    # models.DEFERRED when it was not loaded (only()/defer()), i.e. unknown.
+    # Lets signal receivers detect status changes without re-reading the row.
+    _loaded_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in field_names:
+            instance._loaded_status = values[field_names.index('status')]
+        else:
+            instance._loaded_status = models.DEFERRED
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if (fields is None or 'status' in fields) and 'status' not in self.get_deferred_fields():
+            self._loaded_status = self.status
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if (update_fields is None or 'status' in update_fields) and 'status' not in self.get_deferred_fields():
+            self._loaded_status = self.status
+
     def __str__(self):
         return f"{self.full_name} - {self.payment_type} - {self.amount}"
 
@@ -190,4 +281,102 @@ class CoursePayment(Payment):
     class Meta:
         proxy = True
         verbose_name = "Course Payment"
-        verbose_name_plural = "Course Payments"
\ No newline at end of file
+        verbose_name_plural = "Course Payments"
+
+class EmailOutbox(models.Model):
+    """
+    Transactional outbox for customer emails.
+    Rows are written in the same transaction as the change that triggers them
+    and delivered later by the `send_outbox_emails` management command.
+    """
+    KIND_CHOICES = [
+        ('course', 'Course Payment'),
+        ('book', 'Book Payment'),
+        ('service', 'Service Payment'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    payment = models.ForeignKey(Payment, related_name="emails", on_delete=models.SET_NULL, blank=True, null=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    recipient = models.EmailField()
+    payload = models.JSONField(default=dict)  # keyword arguments for the email helper
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+        verbose_name = "Email Outbox"
+        verbose_name_plural = "Email Outbox"
+
+    def __str__(self):
+        return f"{self.kind} email to {self.recipient} ({self.status})"
+
+
+class StripeEvent(models.Model):
+    """
+    Inbox of verified Stripe webhook events, keyed by Stripe's event id.
+    The webhook only stores events here; `process_stripe_events` applies them.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    stripe_created = models.PositiveBigIntegerField(default=0)  # Unix timestamp from Stripe, used for ordering
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['stripe_created', 'id']
+        indexes = [
+            models.Index(fields=['status', 'stripe_created', 'id'], name='stripe_event_queue_idx'),
+        ]
+        verbose_name = "Stripe Event"
+        verbose_name_plural = "Stripe Events"
+
+    def __str__(self):
+        return f"{self.type} ({self.event_id}) - {self.status}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    First response to a request sent with an `Idempotency-Key` header, replayed
+    to retries of the same request (see services/idempotency.py).
+    """
+    STATUS_CHOICES = [
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+    ]
+
+    key = models.CharField(max_length=300, unique=True)  # "<scope>:<client key>"
+    request_fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='processing')
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_body = models.JSONField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Keys"
+
+    def __str__(self):
+        return f"{self.key} ({self.status})"
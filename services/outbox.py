@@ -0,0 +1,159 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EmailOutbox, Course, Book
+from .email_helper import send_course_payment_email, send_book_payment_email, send_service_payment_email
+
+
+EMAIL_SENDERS = {
+    'course': send_course_payment_email,
+    'book': send_book_payment_email,
+    'service': send_service_payment_email,
+}
+
+MAX_ATTEMPTS = 8
+BASE_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 60 * 60
+# How long a claimed row stays invisible to other workers while it is being sent.
+# If a worker dies mid-send the row simply becomes due again after the lease.
+LEASE_SECONDS = 120
+
+
+def enqueue_email(kind, recipient, payment=None, **payload):
+    """
+    Queue an email for delivery by the outbox worker.
+    Must be called inside the transaction that triggers the email.
+    """
+    if kind not in EMAIL_SENDERS:
+        raise ValueError(f"Unknown email kind: {kind}")
+
+    return EmailOutbox.objects.create(
+        payment=payment,
+        kind=kind,
+        recipient=recipient,
+        payload={'email': recipient, **payload},
+    )
+
+
+def enqueue_payment_success_email(payment):
+    """Queue the confirmation email matching the payment type."""
+    if payment.payment_type == "course":
+        # ✅ Fetch course details
+        course = Course.objects.filter(id=payment.item_id).first()
+        if course:
+            enqueue_email(
+                "course",
+                payment.email,
+                payment=payment,
+                full_name=payment.full_name,
+                course_title=course.title,
+                access_code=course.access_code,
+                course_link=f"https://zionoshiobugie.com/courses/owned/{course.id}",
+            )
+
+    elif payment.payment_type == "book":
+        book = Book.objects.filter(id=payment.item_id).first()
+        if book:
+            enqueue_email(
+                "book",
+                payment.email,
+                payment=payment,
+                full_name=payment.full_name,
+                book_title=book.title,
+                book_links={
+                    "Kindle": book.kindle_link,
+                    "Paperback": book.paperback_link,
+                    "PDF": book.pdf_link,
+                },
+            )
+
+    elif payment.payment_type == "service":
+        enqueue_email(
+            "service",
+            payment.email,
+            payment=payment,
+            full_name=payment.full_name,
+            service_name=payment.item_name,
+        )
+
+
+def backoff_seconds(attempts):
+    """Exponential backoff: 30s, 60s, 120s, ... capped at one hour."""
+    return min(BASE_BACKOFF_SECONDS * (2 ** max(attempts - 1, 0)), MAX_BACKOFF_SECONDS)
+
+
+def claim_next_email():
+    """
+    Lease the next due row so concurrent workers never send the same email twice.
+    Rows are leased one at a time, right before they are sent: a lease taken for a
+    whole batch could run out while earlier rows of the batch are still being sent
+    (each send can take over 30s with retries), and another worker would then send
+    the queued rows again. Returns None when nothing is due.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        row = (
+            EmailOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .first()
+        )
+        if row is not None:
+            row.next_attempt_at = now + timedelta(seconds=LEASE_SECONDS)
+            row.save(update_fields=['next_attempt_at'])
+    return row
+
+
+def deliver(row, max_attempts=MAX_ATTEMPTS):
+    """
+    Send one leased outbox row and record the outcome. Returns True when the email went out.
+    The outcome is only written while the lease is still ours; if it ran out and another
+    worker took the row over, that worker's record wins.
+    """
+    sender = EMAIL_SENDERS[row.kind]
+    lease = row.next_attempt_at
+    row.attempts += 1
+
+    try:
+        delivered = sender(**row.payload)
+        error = None if delivered else "SendGrid rejected the message"
+    except Exception as e:
+        delivered = False
+        error = str(e)
+
+    now = timezone.now()
+    if delivered:
+        row.status = 'sent'
+        row.sent_at = now
+        row.last_error = None
+    else:
+        row.last_error = error
+        if row.attempts >= max_attempts:
+            row.status = 'failed'
+        else:
+            row.next_attempt_at = now + timedelta(seconds=backoff_seconds(row.attempts))
+
+    recorded = EmailOutbox.objects.filter(pk=row.pk, status='pending', next_attempt_at=lease).update(
+        status=row.status, attempts=row.attempts, next_attempt_at=row.next_attempt_at,
+        last_error=row.last_error, sent_at=row.sent_at,
+    )
+    if not recorded:
+        print(f"⚠️ Outbox email {row.pk} lease expired while sending; outcome not recorded")
+    return delivered
+
+
+def deliver_due_emails(batch_size=50, max_attempts=MAX_ATTEMPTS):
+    """Send up to `batch_size` due emails, leasing each just before it is sent. Returns (sent, failed) counts."""
+    sent = failed = 0
+    for _ in range(batch_size):
+        row = claim_next_email()
+        if row is None:
+            break
+        if deliver(row, max_attempts=max_attempts):
+            sent += 1
+        else:
+            failed += 1
+    return sent, failed
@@ -0,0 +1,51 @@
+import hashlib
+from urllib.parse import urlencode
+
+from rest_framework.pagination import CursorPagination
+
+
+class CatalogCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the catalog lists, newest first.
+    Backed by the (created_at, id) indexes on Book and Course.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def paginated_data(self, queryset, request, serialize, params):
+        """
+        `serialize` turns the page (model instances or value rows) into a list of dicts.
+        `next`/`previous` are relative (query string only) and keep just the shaping
+        `params`: the page is cached for every host, scheme and tracking tag alike.
+        """
+        page = self.paginate_queryset(queryset, request)
+        self.base_url = '?' + urlencode(shaping_params(request, params))
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': serialize(page),
+        }
+
+
+def pagination_requested(request):
+    """Pagination is opt-in so existing clients keep getting the full list."""
+    return CatalogCursorPagination.cursor_query_param in request.query_params or \
+        CatalogCursorPagination.page_size_query_param in request.query_params
+
+
+def shaping_params(request, params):
+    """The (param, value) pairs among `params` present in the query string, sorted."""
+    return sorted((param, request.query_params.get(param)) for param in params if param in request.query_params)
+
+
+def query_entry(name, request, params):
+    """
+    Cache entry name for a list variant, keyed by the query parameters that shape it.
+    Unrelated parameters (tracking tags etc.) map to the same entry.
+    """
+    shaping = shaping_params(request, params)
+    if not shaping:
+        return name
+    return f"{name}:q:{hashlib.md5(repr(shaping).encode()).hexdigest()}"
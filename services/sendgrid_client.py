@@ -0,0 +1,115 @@
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# SendGrid accepts at most 1000 personalizations per request
+MAX_PERSONALIZATIONS = 1000
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return the process-wide SendGrid session.
+    Connections are pooled and kept alive, and 429/5xx responses and failed
+    connects are retried with backoff (honouring Retry-After) before the caller
+    sees them. Read timeouts and other errors after the request was sent are not
+    retried: SendGrid may already have accepted the mail, and these mails carry
+    access codes that must not go out twice.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=settings.SENDGRID_MAX_RETRIES,
+                    read=False,
+                    other=False,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=frozenset(['POST']),
+                    backoff_factor=0.5,
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.SENDGRID_POOL_SIZE, max_retries=retry)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def reset_session():
+    """Drop the shared session (used by tests and after settings changes)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def _post(data):
+    headers = {
+        "Authorization": f"Bearer {settings.SENDGRID_API_KEY}",
+        "Content-Type": "application/json",
+    }
+    return get_session().post(
+        settings.SENDGRID_API_URL,
+        json=data,
+        headers=headers,
+        timeout=(settings.SENDGRID_CONNECT_TIMEOUT, settings.SENDGRID_READ_TIMEOUT),
+    )
+
+
+def _build_message(personalizations, from_name, text_content, html_content):
+    return {
+        "personalizations": personalizations,
+        "from": {"email": settings.DEFAULT_FROM_EMAIL, "name": from_name},
+        "content": [
+            {"type": "text/plain", "value": text_content},
+            {"type": "text/html", "value": html_content},
+        ],
+    }
+
+
+def send_email(to_email, subject, from_name, text_content, html_content):
+    """Send a single email. Returns True when SendGrid accepted it."""
+    data = _build_message([{"to": [{"email": to_email}], "subject": subject}], from_name, text_content, html_content)
+    response = _post(data)
+
+    if response.status_code not in [200, 202]:
+        print(f"❌ SendGrid Error ({response.status_code}): {response.text}")
+        return False
+    return True
+
+
+def send_batch(recipients, subject, from_name, text_content, html_content):
+    """
+    Send the same email to many recipients using one personalization per recipient,
+    packing up to MAX_PERSONALIZATIONS recipients into each request.
+
+    recipients: list of dicts like {"email": "...", "substitutions": {"-name-": "Ada"}}
+    Substitution tags may appear in the subject and in both content bodies.
+    Returns the number of recipients SendGrid accepted.
+    """
+    accepted = 0
+    for start in range(0, len(recipients), MAX_PERSONALIZATIONS):
+        chunk = recipients[start:start + MAX_PERSONALIZATIONS]
+        personalizations = []
+        for recipient in chunk:
+            personalization = {"to": [{"email": recipient["email"]}], "subject": subject}
+            if recipient.get("substitutions"):
+                personalization["substitutions"] = recipient["substitutions"]
+            personalizations.append(personalization)
+
+        response = _post(_build_message(personalizations, from_name, text_content, html_content))
+        if response.status_code in [200, 202]:
+            accepted += len(chunk)
+        else:
+            print(f"❌ SendGrid Error ({response.status_code}): {response.text}")
+    return accepted
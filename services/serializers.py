@@ -1,14 +1,138 @@
-from rest_framework import serializers
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 from .models import Book,Course,CourseLesson,ContactMessage,StrategyCall,SpeakerInvitation
 
-class BookSerializer(serializers.ModelSerializer):
+
+class SparseFieldsMixin:
+    """
+    Lets callers trim the output with `fields=[...]` (keep only these) and/or
+    `omit=[...]` (drop these), and narrow the SQL column list to match.
+    """
+
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in omit or []:
+            self.fields.pop(name, None)
+
+    @classmethod
+    def narrow_queryset(cls, queryset, fields=None, omit=None):
+        """
+        Load only the columns the trimmed output needs.
+        The primary key and created_at are always loaded for ordering and cursors.
+        """
+        model = queryset.model
+        columns = {field.name for field in model._meta.concrete_fields}
+        required = {model._meta.pk.name, 'created_at'}
+
+        if fields is not None:
+            queryset = queryset.only(*(required | (set(fields) & columns)))
+        if omit:
+            deferred = (set(omit) & columns) - required
+            if deferred:
+                queryset = queryset.defer(*deferred)
+        return queryset
+
+
+def sparse_fieldset(request, serializer_class):
+    """
+    Parse `?fields=a,b` and `?omit=c` into lists, rejecting unknown field names.
+    Returns (fields, omit); either may be None when the parameter is absent.
+    """
+    known = set(serializer_class().fields)
+    parsed = []
+    for param in ('fields', 'omit'):
+        value = request.query_params.get(param)
+        if value is None:
+            parsed.append(None)
+            continue
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = set(names) - known
+        if unknown:
+            raise serializers.ValidationError({param: f"Unknown field(s): {', '.join(sorted(unknown))}"})
+        parsed.append(names)
+    return tuple(parsed)
+
+
+class ValuesListSerializer:
+    """
+    Read-only fast path for catalog lists.
+    Produces exactly what `serializer_class(queryset, many=True).data` would, but reads
+    `.values()` rows and applies a per-field converter plan built once per request,
+    skipping model instantiation and per-row serializer machinery.
+    Method fields must be mapped to a column or annotation via `values_sources`.
+    """
+    # Fields whose to_representation returns DB values unchanged
+    PASSTHROUGH = (serializers.CharField, serializers.BooleanField, serializers.IntegerField, serializers.JSONField)
+
+    def __init__(self, serializer_class, fields=None, omit=None):
+        serializer = serializer_class(fields=fields, omit=omit)
+        sources = getattr(serializer_class, 'values_sources', {})
+
+        self.plan = []
+        for name, field in serializer.fields.items():
+            if name in sources:
+                self.plan.append((name, sources[name], None))
+            elif isinstance(field, serializers.SerializerMethodField):
+                raise ImproperlyConfigured(f"{serializer_class.__name__}.{name} needs an entry in values_sources")
+            elif isinstance(field, serializers.DateTimeField):
+                self.plan.append((name, field.source, self.datetime_converter(field)))
+            else:
+                convert = None if isinstance(field, self.PASSTHROUGH) else field.to_representation
+                self.plan.append((name, field.source, convert))
+
+    @staticmethod
+    def datetime_converter(field):
+        """
+        DateTimeField.to_representation looks up the current timezone on every call.
+        For the usual ISO 8601 output of aware datetimes, resolve it once per plan instead.
+        """
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+            return field.to_representation
+
+        def convert(value):
+            if isinstance(value, str) or timezone.is_naive(value):
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return convert
+
+    def values(self, queryset):
+        """The queryset as rows holding just the needed columns (plus the ordering keys)."""
+        columns = {source for _, source, _ in self.plan}
+        return queryset.values(*(columns | {queryset.model._meta.pk.name, 'created_at'}))
+
+    def to_representation(self, rows):
+        plan = self.plan
+        data = []
+        for row in rows:
+            item = {}
+            for name, source, convert in plan:
+                value = row[source]
+                item[name] = value if convert is None or value is None else convert(value)
+            data.append(item)
+        return data
+
+
+class BookSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Book
-        fields = '__all__'
+        # Stripe bookkeeping is internal
+        exclude = ['stripe_product_id', 'stripe_price_id', 'stripe_synced_title', 'stripe_synced_price']
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     modules_count = serializers.SerializerMethodField()
+    # Column behind each method field for ValuesListSerializer
+    values_sources = {'modules_count': 'lessons_count'}
     
     class Meta:
         model = Course
@@ -18,6 +142,9 @@ class CourseSerializer(serializers.ModelSerializer):
         ]
 
     def get_modules_count(self, obj):
+        # List views annotate the count up front (Course.objects.with_lessons_count())
+        if hasattr(obj, 'lessons_count'):
+            return obj.lessons_count
         return obj.lessons.count()
     
 
@@ -27,6 +154,13 @@ class CourseLessonSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'video_url', 'resource', 'order']
 
 
+class CourseLessonOutlineSerializer(serializers.ModelSerializer):
+    """Just enough to draw the lesson list; video URLs come from the per-lesson endpoint."""
+    class Meta:
+        model = CourseLesson
+        fields = ['id', 'title', 'order']
+
+
 class CourseDetailSerializer(serializers.ModelSerializer):
     lessons = CourseLessonSerializer(many=True, read_only=True)
 
@@ -40,6 +174,22 @@ class CourseDetailSerializer(serializers.ModelSerializer):
         ]
 
 
+class CoursePublicDetailSerializer(serializers.ModelSerializer):
+    """
+    What anyone may see of a course: no access code and no video URLs or resources.
+    The full CourseDetailSerializer is only returned by access_course.
+    """
+    lessons = CourseLessonOutlineSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Course
+        fields = [
+            'id', 'title', 'description', 'duration', 'price',
+            'instructor_name', 'instructor_photo', 'thumbnail',
+            'what_you_learn', 'who_is_for', 'created_at', 'lessons'
+        ]
+
+
 class ContactMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ContactMessage
@@ -1,69 +1,43 @@
-from django.db.models.signals import pre_save, post_save
+from django.db import transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Payment, Course, Book
-from .email_helper import send_course_payment_email, send_book_payment_email,send_service_payment_email
-
-
-@receiver(pre_save, sender=Payment)
-def store_previous_status(sender, instance, **kwargs):
-    """Temporarily store the old status to detect changes."""
-    if instance.pk:
-        try:
-            old_instance = Payment.objects.get(pk=instance.pk)
-            instance._previous_status = old_instance.status
-        except Payment.DoesNotExist:
-            instance._previous_status = None
-    else:
-        instance._previous_status = None
+from .models import Payment, Book, Course, CourseLesson
+from . import catalog_cache
+from .outbox import enqueue_payment_success_email
 
 
 @receiver(post_save, sender=Payment)
-def send_payment_success_email(sender, instance, created, **kwargs):
+def queue_payment_success_email(sender, instance, created, **kwargs):
     """
-    Sends the correct email when a payment transitions to 'success'.
-    Uses helper functions for clean structure.
+    Queues the correct email when a payment transitions to 'success'.
+    The outbox row is written in the caller's transaction; delivery happens
+    in the `send_outbox_emails` worker so webhooks never wait on SendGrid.
     """
-    # Only trigger when status changes to 'success'
-    if getattr(instance, "_previous_status", None) != "success" and instance.status.lower() == "success":
-        try:
-            if instance.payment_type == "course":
-                # ✅ Fetch course details
-                course = Course.objects.filter(id=instance.item_id).first()
-                if course:
-                    course_link = f"https://zionoshiobugie.com/courses/owned/{course.id}"
-                    access_code = course.access_code
-
-                    # 👇 Use your helper function to send email
-                    send_course_payment_email(
-                        email=instance.email,
-                        full_name=instance.full_name,
-                        course_title=course.title,
-                        access_code=access_code,
-                        course_link=course_link
-                    )
-                    print(f"✅ Course payment email sent to {instance.email}")
-
-            elif instance.payment_type == "book":
-                book = Book.objects.filter(id=instance.item_id).first()
-                if book:
-                    book_links = {
-                        "Kindle": book.kindle_link,
-                        "Paperback": book.paperback_link,
-                        "PDF": book.pdf_link,
-                    }
-                    send_book_payment_email(
-                        email=instance.email,
-                        full_name=instance.full_name,
-                        book_title=book.title,
-                        book_links=book_links
-                    )
+    # Only trigger when status changes to 'success'.
+    # _loaded_status still holds the pre-save value here; Payment.save() refreshes it afterwards.
+    # When it was never loaded (deferred), the change cannot be told apart from a re-save, so skip.
+    if instance._loaded_status is DEFERRED:
+        return
+    if instance._loaded_status != "success" and instance.status.lower() == "success":
+        enqueue_payment_success_email(instance)
+
+
+@receiver([post_save, post_delete], sender=Book)
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=CourseLesson)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    """
+    Any catalog edit moves the catalog version, which retires every cached entry and ETag.
+    Bumped only once the edit is committed: a request that read the new version before
+    then would cache the old rows under it.
+    """
+    transaction.on_commit(catalog_cache.bump_catalog_version)
 
-            elif instance.payment_type == "service": 
-                send_service_payment_email(
-                    email=instance.email,
-                    full_name=instance.full_name,
-                    service_name=instance.item_name
-                )
 
-        except Exception as e:
-            print(f"❌ Failed to send success email for {instance.email}: {e}")
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=CourseLesson)
+def invalidate_course_cache(sender, instance, **kwargs):
+    """Course and lesson edits also retire that course's cached detail and access data."""
+    course_id = instance.pk if sender is Course else instance.course_id
+    transaction.on_commit(lambda: catalog_cache.bump_course_version(course_id))
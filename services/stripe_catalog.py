@@ -0,0 +1,72 @@
+from .stripe_client import call, get_client
+
+
+CURRENCY = 'usd'
+
+
+def item_type(item):
+    return item._meta.model_name  # "book" or "course"
+
+
+def unit_amount(price):
+    return int(price * 100)  # Stripe expects amounts in cents
+
+
+def is_synced(item):
+    return bool(item.stripe_price_id) and item.stripe_synced_title == item.title and \
+        item.stripe_synced_price == item.price
+
+
+def sync_item(item):
+    """
+    Make sure the Book/Course has a Stripe Product and an active Price matching its
+    current title and price, and return the Price ID.
+
+    Nothing is sent to Stripe while title and price are unchanged since the last sync.
+    A new title renames the Product; a new price creates a new Price and archives the
+    old one (Stripe prices are immutable). Creates use idempotency keys, so concurrent
+    checkouts of a new item end up with a single Product/Price.
+    """
+    if is_synced(item):
+        return item.stripe_price_id
+
+    client = get_client()
+    kind = item_type(item)
+    product_id = item.stripe_product_id
+
+    if not product_id:
+        product = call(
+            client.v1.products.create,
+            params={'name': item.title, 'metadata': {'type': kind, 'id': str(item.pk)}},
+            options={'idempotency_key': f"catalog-product:{kind}:{item.pk}"},
+        )
+        product_id = product.id
+    elif item.stripe_synced_title != item.title:
+        call(client.v1.products.update, product_id, params={'name': item.title})
+
+    price_id = item.stripe_price_id
+    if not price_id or item.stripe_synced_price != item.price:
+        amount = unit_amount(item.price)
+        price = call(
+            client.v1.prices.create,
+            params={'product': product_id, 'currency': CURRENCY, 'unit_amount': amount},
+            # Keyed on the price being replaced too, so going back to an earlier amount gets a fresh Price
+            options={'idempotency_key': f"catalog-price:{product_id}:{price_id or 'first'}:{amount}"},
+        )
+        if price_id and price_id != price.id:
+            call(client.v1.prices.update, price_id, params={'active': False})
+        price_id = price.id
+
+    # update() rather than save(): this is bookkeeping, not a catalog edit, so no cache
+    # invalidation or snapshot rebuild should follow
+    type(item).objects.filter(pk=item.pk).update(
+        stripe_product_id=product_id,
+        stripe_price_id=price_id,
+        stripe_synced_title=item.title,
+        stripe_synced_price=item.price,
+    )
+    item.stripe_product_id = product_id
+    item.stripe_price_id = price_id
+    item.stripe_synced_title = item.title
+    item.stripe_synced_price = item.price
+    return price_id
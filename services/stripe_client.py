@@ -0,0 +1,170 @@
+import math
+import threading
+import time
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+class StripeUnavailable(Exception):
+    """Stripe is down, slow or saturated; the caller should answer 503 with Retry-After."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and fails every call fast
+    for `reset_seconds`. Then a single trial call is let through (half-open):
+    success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                raise StripeUnavailable("Stripe circuit breaker is open", retry_after=remaining)
+            if self.trial_in_flight:
+                raise StripeUnavailable("Stripe circuit breaker is half-open", retry_after=1)
+            self.trial_in_flight = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            # A failed half-open trial re-opens straight away
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+_client = None
+_breaker = None
+_slots = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process-wide StripeClient. It keeps one pooled, keep-alive HTTP session
+    with explicit connect/read timeouts. STRIPE_API_BASE points it at stripe-mock or
+    a local fake server.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=settings.STRIPE_MAX_CONCURRENT_CHECKOUTS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                http_client = stripe.RequestsClient(
+                    timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+                    session=session,
+                )
+                base_addresses = {'api': settings.STRIPE_API_BASE} if settings.STRIPE_API_BASE else None
+                _client = stripe.StripeClient(
+                    settings.STRIPE_SECRET_KEY,
+                    http_client=http_client,
+                    base_addresses=base_addresses,
+                    max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+                )
+    return _client
+
+
+def get_breaker():
+    """Process-wide circuit breaker and concurrency slots for Stripe calls."""
+    global _breaker, _slots
+    if _breaker is None:
+        with _client_lock:
+            if _breaker is None:
+                _slots = threading.BoundedSemaphore(settings.STRIPE_MAX_CONCURRENT_CHECKOUTS)
+                _breaker = CircuitBreaker(settings.STRIPE_BREAKER_FAILURE_THRESHOLD, settings.STRIPE_BREAKER_RESET_SECONDS)
+    return _breaker
+
+
+def reset_client():
+    """Drop the client, breaker state and concurrency slots (tests and settings changes)."""
+    global _client, _breaker, _slots
+    with _client_lock:
+        _client = _breaker = _slots = None
+
+
+def check_available():
+    """Raise StripeUnavailable right away while the breaker is open, before doing any other work."""
+    breaker = get_breaker()
+    with breaker.lock:
+        if breaker.opened_at is not None and breaker.opened_at + breaker.reset_seconds > time.monotonic():
+            raise StripeUnavailable(
+                "Stripe circuit breaker is open",
+                retry_after=breaker.opened_at + breaker.reset_seconds - time.monotonic(),
+            )
+
+
+def _is_outage(error):
+    """Network errors, timeouts, rate limits and 5xx count against the breaker; 4xx do not."""
+    if isinstance(error, (stripe.APIConnectionError, stripe.RateLimitError)):
+        return True
+    return (error.http_status or 0) >= 500
+
+
+def call(func, *args, **kwargs):
+    """
+    Run one Stripe API call through the circuit breaker and the per-process
+    concurrency limit (STRIPE_MAX_CONCURRENT_CHECKOUTS). Outages are raised as
+    StripeUnavailable; other Stripe errors (bad request, card declined) propagate.
+    """
+    breaker = get_breaker()
+    slots = _slots
+    check_available()
+
+    # Waiting for a slot is bounded too, so a slow Stripe never queues up every worker
+    if not slots.acquire(timeout=settings.STRIPE_CONCURRENCY_WAIT_SECONDS):
+        raise StripeUnavailable("Too many concurrent Stripe requests", retry_after=1)
+    try:
+        breaker.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except stripe.StripeError as e:
+            if not _is_outage(e):
+                # Stripe answered, so it is up; the request itself was bad
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            retry_after = breaker.reset_seconds if breaker.is_open else 1
+            raise StripeUnavailable(f"Stripe is unavailable: {e}", retry_after=retry_after) from e
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return result
+    finally:
+        slots.release()
+
+
+def create_checkout_session(params, idempotency_key=None):
+    options = {'idempotency_key': idempotency_key} if idempotency_key else {}
+    return call(get_client().v1.checkout.sessions.create, params=params, options=options)
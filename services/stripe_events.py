@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Payment, StripeEvent
+
+
+# Stripe checkout events and the payment status each one moves to
+STRIPE_EVENT_STATUSES = {
+    'checkout.session.completed': 'success',
+    'checkout.session.expired': 'expired',
+    'checkout.session.async_payment_failed': 'failed',
+}
+
+
+def record_event(event):
+    """
+    Store a verified event in the inbox with a single INSERT.
+    Redeliveries of the same event id are silently ignored.
+    """
+    StripeEvent.objects.bulk_create(
+        [StripeEvent(
+            event_id=event['id'],
+            type=event['type'],
+            stripe_created=event.get('created') or 0,
+            payload=event,
+        )],
+        ignore_conflicts=True,
+    )
+
+
+def apply_event(payload):
+    """Apply one event's side effects. Safe to run more than once for the same event."""
+    status_for_event = STRIPE_EVENT_STATUSES.get(payload['type'])
+    if status_for_event:
+        session = payload['data']['object']
+        Payment.objects.transition(session.get('id'), status_for_event)
+
+
+def process_pending_events(batch_size=100):
+    """
+    Apply one batch of pending events in Stripe's creation order.
+    Each event runs in its own savepoint so one bad event cannot block the rest.
+    Returns (processed, failed) counts.
+    """
+    processed = failed = 0
+    with transaction.atomic():
+        events = list(
+            StripeEvent.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='pending')
+            .order_by('stripe_created', 'id')[:batch_size]
+        )
+        for event in events:
+            event.attempts += 1
+            try:
+                with transaction.atomic():
+                    apply_event(event.payload)
+            except Exception as e:
+                event.status = 'failed'
+                event.last_error = str(e)
+                failed += 1
+            else:
+                event.status = 'processed'
+                event.last_error = None
+                event.processed_at = timezone.now()
+                processed += 1
+            event.save(update_fields=['status', 'attempts', 'last_error', 'processed_at'])
+    return processed, failed
+
+
+def replay_failed_events(queryset=None):
+    """Put failed events back in the queue. Returns how many were requeued."""
+    if queryset is None:
+        queryset = StripeEvent.objects.all()
+    return queryset.filter(status='failed').update(status='pending')
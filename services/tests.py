@@ -1,3 +1,1514 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs
 
-# Create your tests here.
+import brotli
+import stripe
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import catalog_cache, catalog_snapshot, course_access, email_templates, idempotency, outbox, sendgrid_client, stripe_client, throttling
+from .renderers import ORJSONRenderer, ORJSONParser
+from .serializers import ContactMessageSerializer
+from .models import Payment, EmailOutbox, StripeEvent, Book, Course, CourseLesson, ContactMessage, IdempotencyKey
+from .stripe_events import record_event, process_pending_events, replay_failed_events
+
+
+class FakeSendGridHandler(BaseHTTPRequestHandler):
+    """Records every request and answers with the next queued status code (202 by default)."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append({
+            'path': self.path,
+            'headers': dict(self.headers),
+            'json': json.loads(body),
+            'connection': self.client_address,
+        })
+        code = self.server.responses.pop(0) if self.server.responses else 202
+        if code == 'slow':
+            # Accept the mail but answer after the client's read timeout
+            time.sleep(0.5)
+            code = 202
+        self.send_response(code)
+        self.send_header('Content-Length', '0')
+        if code == 429:
+            self.send_header('Retry-After', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeSendGridServer:
+    def __init__(self):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeSendGridHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.requests = []
+        self.httpd.responses = []
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/v3/mail/send"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self.httpd
+
+    def __exit__(self, *exc):
+        # Close pooled keep-alive sockets so the handler threads can exit
+        sendgrid_client.reset_session()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class SendGridTransportTests(TestCase):
+    def setUp(self):
+        sendgrid_client.reset_session()
+        self.addCleanup(sendgrid_client.reset_session)
+
+    def run_against_fake(self, func, responses=()):
+        server = FakeSendGridServer()
+        with server as httpd, override_settings(SENDGRID_API_URL=server.url, SENDGRID_API_KEY='test-key', DEFAULT_FROM_EMAIL='no-reply@example.com'):
+            httpd.responses.extend(responses)
+            result = func()
+        return result, httpd.requests
+
+    def test_send_email_reuses_pooled_connection(self):
+        def send_twice():
+            return [
+                sendgrid_client.send_email('a@example.com', 'Hi', 'MrZion', 'text', '<p>html</p>'),
+                sendgrid_client.send_email('b@example.com', 'Hi', 'MrZion', 'text', '<p>html</p>'),
+            ]
+
+        results, requests = self.run_against_fake(send_twice)
+        self.assertEqual(results, [True, True])
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(requests[0]['headers']['Authorization'], 'Bearer test-key')
+        self.assertEqual(requests[0]['json']['from'], {'email': 'no-reply@example.com', 'name': 'MrZion'})
+        # Keep-alive: both requests arrive over the same client socket
+        self.assertEqual(requests[0]['connection'], requests[1]['connection'])
+
+    def test_send_email_retries_on_429_and_5xx(self):
+        result, requests = self.run_against_fake(
+            lambda: sendgrid_client.send_email('a@example.com', 'Hi', 'MrZion', 'text', 'html'),
+            responses=[429, 503],
+        )
+        self.assertTrue(result)
+        self.assertEqual(len(requests), 3)
+
+    def test_read_timeouts_are_not_retried(self):
+        with override_settings(SENDGRID_READ_TIMEOUT=0.2):
+            result, requests = self.run_against_fake(
+                lambda: self.assertRaises(
+                    sendgrid_client.requests.exceptions.ReadTimeout,
+                    sendgrid_client.send_email, 'a@example.com', 'Hi', 'MrZion', 'text', 'html',
+                ),
+                responses=['slow'],
+            )
+        self.assertEqual(len(requests), 1)
+
+    def test_send_email_reports_client_errors(self):
+        result, requests = self.run_against_fake(
+            lambda: sendgrid_client.send_email('a@example.com', 'Hi', 'MrZion', 'text', 'html'),
+            responses=[400],
+        )
+        self.assertFalse(result)
+        self.assertEqual(len(requests), 1)
+
+    def test_send_batch_packs_personalizations(self):
+        recipients = [{'email': f'user{i}@example.com', 'substitutions': {'-name-': f'User {i}'}} for i in range(1500)]
+        accepted, requests = self.run_against_fake(
+            lambda: sendgrid_client.send_batch(recipients, 'Hello -name-', 'MrZion', 'Hi -name-', '<p>Hi -name-</p>'),
+        )
+        self.assertEqual(accepted, 1500)
+        self.assertEqual([len(r['json']['personalizations']) for r in requests], [1000, 500])
+        self.assertEqual(requests[1]['json']['personalizations'][0], {
+            'to': [{'email': 'user1000@example.com'}],
+            'subject': 'Hello -name-',
+            'substitutions': {'-name-': 'User 1000'},
+        })
+
+
+class EmailTemplateTests(TestCase):
+    def test_html_escapes_values_and_text_keeps_them_raw(self):
+        subject, text, html = email_templates.render_course_payment_email(
+            '<script>alert(1)</script>', 'Say "hi" & <b>grow</b>', 'CODE1', 'https://example.com/c?a=1&b=2',
+        )
+        self.assertNotIn('<script>', html)
+        self.assertIn('Hi &lt;script&gt;alert(1)&lt;/script&gt;,', html)
+        self.assertIn('<strong>Say &quot;hi&quot; &amp; &lt;b&gt;grow&lt;/b&gt;</strong>', html)
+        self.assertIn('href="https://example.com/c?a=1&amp;b=2"', html)
+
+        self.assertIn('Hi <script>alert(1)</script>,', text)
+        self.assertIn('Your payment for "Say "hi" & <b>grow</b>"', text)
+        self.assertEqual(subject, 'Payment Confirmed for Say "hi" & <b>grow</b> 🎉')
+
+    def test_safe_slots_are_not_escaped(self):
+        template = email_templates.EmailTemplate('<p>{{ name }}</p>{{ body|safe }}{{ name|safe }}')
+        self.assertEqual(
+            template.render(name='<i>Ada</i>', body='<b>ok</b>', unused='x'),
+            '<p>&lt;i&gt;Ada&lt;/i&gt;</p><b>ok</b><i>Ada</i>',
+        )
+
+        _, _, html = email_templates.render_book_payment_email(
+            'Ada', 'Book', {'Kindle': 'https://example.com/k?a=1&b="2"', 'PDF': None},
+        )
+        self.assertIn('<p><strong>Kindle:</strong> <a href="https://example.com/k?a=1&amp;b=&quot;2&quot;"', html)
+        self.assertNotIn('PDF', html)
+
+    def test_literal_braces_and_missing_slots(self):
+        template = email_templates.EmailTemplate('a { b } {{x}} {{ y }}', autoescape=False)
+        self.assertEqual(template.render(x=1, y='<'), 'a { b } 1 <')
+        with self.assertRaises(TypeError):
+            template.render(x=1)
+        self.assertEqual(email_templates.EmailTemplate('{static}').render(extra=1), '{static}')
+        with self.assertRaises(ValueError):
+            email_templates.EmailTemplate('{{ class }}')
+
+
+class OutboxWorkerTests(TestCase):
+    def setUp(self):
+        self.sent = []
+        self.results = []
+        patcher = mock.patch.dict(outbox.EMAIL_SENDERS, {'service': self.fake_sender})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_sender(self, **payload):
+        self.sent.append(payload['email'])
+        result = self.results.pop(0) if self.results else True
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def enqueue(self, recipient='ada@example.com'):
+        return outbox.enqueue_email('service', recipient, full_name='Ada', service_name='Mentorship')
+
+    def test_claim_leases_one_row_until_the_lease_runs_out(self):
+        first, second = self.enqueue('a@example.com'), self.enqueue('b@example.com')
+        claimed = outbox.claim_next_email()
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(outbox.claim_next_email().pk, second.pk)
+        self.assertIsNone(outbox.claim_next_email())
+
+        later = timezone.now() + timedelta(seconds=outbox.LEASE_SECONDS + 1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(outbox.claim_next_email().pk, first.pk)
+
+    def test_deliver_due_emails_sends_each_row_once(self):
+        for index in range(3):
+            self.enqueue(f'user{index}@example.com')
+        self.assertEqual(outbox.deliver_due_emails(batch_size=2), (2, 0))
+        self.assertEqual(outbox.deliver_due_emails(batch_size=2), (1, 0))
+        self.assertEqual(outbox.deliver_due_emails(batch_size=2), (0, 0))
+        self.assertEqual(self.sent, ['user0@example.com', 'user1@example.com', 'user2@example.com'])
+        self.assertEqual(EmailOutbox.objects.filter(status='sent').count(), 3)
+
+    def test_backoff_schedule(self):
+        self.assertEqual([outbox.backoff_seconds(n) for n in range(1, 9)], [30, 60, 120, 240, 480, 960, 1920, 3600])
+
+    def test_failures_back_off_then_mark_failed(self):
+        row = self.enqueue()
+        self.results = [False, RuntimeError('timeout'), False]
+        for attempt, error in enumerate(["SendGrid rejected the message", "timeout"], start=1):
+            before = timezone.now()
+            self.assertEqual(outbox.deliver_due_emails(max_attempts=3), (0, 1))
+            row.refresh_from_db()
+            self.assertEqual((row.status, row.attempts, row.last_error), ('pending', attempt, error))
+            self.assertGreaterEqual(row.next_attempt_at, before + timedelta(seconds=outbox.backoff_seconds(attempt)))
+            EmailOutbox.objects.filter(pk=row.pk).update(next_attempt_at=timezone.now())
+
+        self.assertEqual(outbox.deliver_due_emails(max_attempts=3), (0, 1))
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), ('failed', 3))
+        self.assertEqual(outbox.deliver_due_emails(max_attempts=3), (0, 0))
+
+    def test_outcome_is_not_recorded_after_the_lease_was_taken_over(self):
+        row = self.enqueue()
+        claimed = outbox.claim_next_email()
+        # Another worker reclaimed the row after our lease ran out, and sent it
+        EmailOutbox.objects.filter(pk=row.pk).update(status='sent', sent_at=timezone.now())
+        self.results = [False]
+        outbox.deliver(claimed)
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), ('sent', 0))
+
+    def test_admin_requeue_resets_failed_rows_only(self):
+        failed = self.enqueue('failed@example.com')
+        sent = self.enqueue('sent@example.com')
+        EmailOutbox.objects.filter(pk=failed.pk).update(status='failed', attempts=8, next_attempt_at=timezone.now() + timedelta(days=1))
+        EmailOutbox.objects.filter(pk=sent.pk).update(status='sent', attempts=1)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.post(
+            reverse('admin:services_emailoutbox_changelist'),
+            {'action': 'requeue', '_selected_action': [failed.pk, sent.pk]},
+        )
+        self.assertEqual(response.status_code, 302)
+        failed.refresh_from_db()
+        sent.refresh_from_db()
+        self.assertEqual((failed.status, failed.attempts), ('pending', 0))
+        self.assertEqual(sent.status, 'sent')
+        self.assertEqual(outbox.deliver_due_emails(), (1, 0))
+        self.assertEqual(self.sent, ['failed@example.com'])
+
+
+def stripe_event(event_type, session_id, event_id='evt_1', created=1700000000):
+    return {'id': event_id, 'type': event_type, 'created': created, 'data': {'object': {'id': session_id}}}
+
+
+def data_queries(captured):
+    """Drop transaction bookkeeping (SAVEPOINT/RELEASE) and keep reads and writes."""
+    return [q['sql'].split()[0] for q in captured if q['sql'].split()[0] in ('SELECT', 'UPDATE', 'INSERT', 'DELETE')]
+
+
+class StripeWebhookTests(TestCase):
+    def setUp(self):
+        self.payment = Payment.objects.create(
+            full_name='Ada', email='ada@example.com', payment_type='service',
+            item_name='Mentorship', amount='50.00', payment_id='cs_test_123',
+        )
+
+    def post_event(self, event):
+        with mock.patch('stripe.Webhook.construct_event', return_value=event):
+            return self.client.post(reverse('stripe-webhook'), data=json.dumps(event), content_type='application/json')
+
+    def test_webhook_only_stores_the_event(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.post_event(stripe_event('checkout.session.completed', 'cs_test_123'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data_queries(captured), ['INSERT'])
+        self.assertEqual(StripeEvent.objects.get().status, 'pending')
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'pending')
+
+    def test_redelivered_event_is_deduplicated(self):
+        self.post_event(stripe_event('checkout.session.completed', 'cs_test_123'))
+        response = self.post_event(stripe_event('checkout.session.completed', 'cs_test_123'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+
+    def test_invalid_signature_is_rejected(self):
+        error = stripe.SignatureVerificationError('bad', 'sig')
+        with mock.patch('stripe.Webhook.construct_event', side_effect=error):
+            response = self.client.post(reverse('stripe-webhook'), data=b'{}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+
+class StripeEventProcessingTests(TestCase):
+    def setUp(self):
+        self.payment = Payment.objects.create(
+            full_name='Ada', email='ada@example.com', payment_type='service',
+            item_name='Mentorship', amount='50.00', payment_id='cs_test_123',
+        )
+
+    def test_status_change_is_a_single_conditional_update(self):
+        with CaptureQueriesContext(connection) as captured:
+            Payment.objects.transition('cs_test_123', 'expired')
+
+        self.assertEqual(data_queries(captured), ['UPDATE'])
+        update = next(q['sql'] for q in captured if q['sql'].startswith('UPDATE'))
+        self.assertIn('"payment_id" =', update)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'expired')
+
+    def test_success_is_one_read_and_one_write_plus_outbox(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertTrue(Payment.objects.transition('cs_test_123', 'success'))
+
+        self.assertEqual(data_queries(captured), ['UPDATE', 'SELECT', 'INSERT'])
+        self.assertEqual(EmailOutbox.objects.filter(payment=self.payment).count(), 1)
+
+    def test_duplicate_delivery_is_one_write_and_no_second_email(self):
+        Payment.objects.transition('cs_test_123', 'success')
+
+        with CaptureQueriesContext(connection) as captured:
+            self.assertFalse(Payment.objects.transition('cs_test_123', 'success'))
+
+        self.assertEqual(data_queries(captured), ['UPDATE'])
+        self.assertEqual(EmailOutbox.objects.filter(payment=self.payment).count(), 1)
+
+    def test_transition_rejects_disallowed_moves(self):
+        self.assertTrue(Payment.objects.transition('cs_test_123', 'success'))
+        self.assertFalse(Payment.objects.transition('cs_test_123', 'expired'))
+        self.assertFalse(Payment.objects.transition('cs_unknown', 'success'))
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'success')
+
+    def test_events_are_processed_in_stripe_order(self):
+        record_event(stripe_event('checkout.session.expired', 'cs_test_123', event_id='evt_2', created=200))
+        record_event(stripe_event('checkout.session.completed', 'cs_test_123', event_id='evt_1', created=100))
+
+        self.assertEqual(process_pending_events(), (2, 0))
+        self.payment.refresh_from_db()
+        # completed (t=100) applied first, so the later expiry cannot undo it
+        self.assertEqual(self.payment.status, 'success')
+        self.assertEqual(set(StripeEvent.objects.values_list('status', flat=True)), {'processed'})
+
+    def test_failed_events_can_be_replayed(self):
+        record_event(stripe_event('checkout.session.completed', 'cs_test_123'))
+        with mock.patch('services.stripe_events.apply_event', side_effect=RuntimeError('boom')):
+            self.assertEqual(process_pending_events(), (0, 1))
+
+        event = StripeEvent.objects.get()
+        self.assertEqual((event.status, event.last_error), ('failed', 'boom'))
+
+        self.assertEqual(replay_failed_events(), 1)
+        self.assertEqual(process_pending_events(), (1, 0))
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'success')
+
+    def test_loaded_status_tracks_saves(self):
+        payment = Payment.objects.get(pk=self.payment.pk)
+        self.assertEqual(payment._loaded_status, 'pending')
+        payment.status = 'success'
+        payment.save()
+        self.assertEqual(payment._loaded_status, 'success')
+        # Saving again must not queue a second email
+        payment.save()
+        self.assertEqual(EmailOutbox.objects.filter(payment=payment).count(), 1)
+
+    def test_refreshed_and_deferred_loads_do_not_requeue_the_email(self):
+        stale = Payment.objects.get(pk=self.payment.pk)
+        Payment.objects.transition('cs_test_123', 'success')
+        self.assertEqual(EmailOutbox.objects.filter(payment=self.payment).count(), 1)
+
+        stale.refresh_from_db()
+        self.assertEqual(stale._loaded_status, 'success')
+        stale.save()
+        partial = Payment.objects.only('satisfied').get(pk=self.payment.pk)
+        partial.satisfied = True
+        partial.save()
+        Payment.objects.defer('status').get(pk=self.payment.pk).save()
+        self.assertEqual(EmailOutbox.objects.filter(payment=self.payment).count(), 1)
+
+        # A deferred status loaded on access is known again
+        partial = Payment.objects.only('satisfied').get(pk=self.payment.pk)
+        self.assertEqual(partial.status, 'success')
+        self.assertEqual(partial._loaded_status, 'success')
+
+
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        throttling.reset_buckets()
+
+    def committed(self):
+        """Run the on_commit cache invalidation of the edits made in this block."""
+        return self.captureOnCommitCallbacks(execute=True)
+
+    def create_course(self, index, lessons):
+        with self.committed():
+            course = Course.objects.create(
+                title=f'Course {index}', description='About', duration='6 weeks', price='99.00',
+                thumbnail='https://example.com/thumb.png', what_you_learn=['Things'],
+                access_code=f'CODE{index}',
+            )
+            for order in range(1, lessons + 1):
+                CourseLesson.objects.create(course=course, title=f'Lesson {order}', video_url='https://example.com/v', order=order)
+        return course
+
+    def create_book(self, title='Book'):
+        with self.committed():
+            return Book.objects.create(title=title, description='About', cover_image='https://example.com/cover.png', price='10.00')
+
+
+class CourseListQueryTests(CatalogTestCase):
+    def test_course_list_query_count_is_constant(self):
+        self.create_course(0, lessons=2)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('get_courses'))
+        self.assertEqual(response.json()[0]['modules_count'], 2)
+
+        for index in range(1, 6):
+            self.create_course(index, lessons=index)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('get_courses'))
+        self.assertEqual(len(response.json()), 6)
+        self.assertEqual(
+            {course['title']: course['modules_count'] for course in response.json()},
+            {'Course 0': 2, 'Course 1': 1, 'Course 2': 2, 'Course 3': 3, 'Course 4': 4, 'Course 5': 5},
+        )
+
+
+class CatalogCacheTests(CatalogTestCase):
+    def test_repeat_requests_are_served_from_cache(self):
+        self.create_book()
+        first = self.client.get(reverse('get_books'))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('get_books'))
+
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first.content, second.content)
+
+    def test_book_changes_invalidate_the_list(self):
+        book = self.create_book('Old title')
+        self.client.get(reverse('get_books'))
+
+        book.title = 'New title'
+        with self.committed():
+            book.save()
+        self.assertEqual(self.client.get(reverse('get_books')).json()[0]['title'], 'New title')
+
+        with self.committed():
+            book.delete()
+        self.assertEqual(self.client.get(reverse('get_books')).json(), [])
+
+    def test_invalidation_waits_for_the_commit(self):
+        book = self.create_book('Old title')
+        course = self.create_course(0, lessons=1)
+        version = catalog_cache.catalog_version()[0]
+        course_version = catalog_cache.course_version(course.id)[0]
+
+        with self.committed():
+            book.title = 'New title'
+            book.save()
+            CourseLesson.objects.filter(course=course).delete()
+            # Until the commit, readers must keep the old version rather than cache old rows under a new one
+            self.assertEqual(catalog_cache.catalog_version()[0], version)
+            self.assertEqual(catalog_cache.course_version(course.id)[0], course_version)
+
+        self.assertGreater(catalog_cache.catalog_version()[0], version)
+        self.assertGreater(catalog_cache.course_version(course.id)[0], course_version)
+
+    def test_versions_expire_with_the_entries(self):
+        with override_settings(CATALOG_CACHE_TIMEOUT=1):
+            catalog_cache.catalog_version()
+        with mock.patch('time.time', return_value=time.time() + 5):
+            self.assertIsNone(caches['default'].get(catalog_cache.VERSION_KEY))
+
+    def test_lesson_changes_invalidate_course_list_and_detail(self):
+        course = self.create_course(1, lessons=1)
+        self.client.get(reverse('get_courses'))
+        version_before = catalog_cache.catalog_version()[0]
+
+        with self.committed():
+            CourseLesson.objects.create(course=course, title='Extra', video_url='https://example.com/v', order=2)
+
+        self.assertEqual(self.client.get(reverse('get_courses')).json()[0]['modules_count'], 2)
+        self.assertGreater(catalog_cache.catalog_version()[0], version_before)
+
+
+class CatalogConditionalGetTests(CatalogTestCase):
+    def test_matching_etag_is_answered_before_any_query(self):
+        self.create_book()
+        first = self.client.get(reverse('get_books'))
+        self.assertTrue(first['ETag'].startswith('"books-'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('get_books'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since_is_honoured(self):
+        first = self.client.get(reverse('get_courses'))
+        response = self.client.get(reverse('get_courses'), HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalog_change_moves_the_etag(self):
+        book = self.create_book('Old title')
+        first = self.client.get(reverse('get_books'))
+
+        book.title = 'New title'
+        with self.committed():
+            book.save()
+
+        response = self.client.get(reverse('get_books'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.json()[0]['title'], 'New title')
+
+
+class CatalogPaginationTests(CatalogTestCase):
+    def test_cursor_pages_walk_the_whole_list(self):
+        for index in range(5):
+            self.create_book(f'Book {index}')
+
+        titles = []
+        url = reverse('get_books') + '?limit=2'
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 2)
+            titles += [book['title'] for book in page['results']]
+            url = page['next'] and reverse('get_books') + page['next']
+
+        self.assertEqual(titles, [f'Book {index}' for index in reversed(range(5))])
+
+    def test_cached_links_do_not_depend_on_host_or_extra_params(self):
+        for index in range(3):
+            self.create_book(f'Book {index}')
+        poisoned = self.client.get(reverse('get_books'), {'limit': 1, 'utm_source': 'x'}, HTTP_HOST='evil.example')
+        self.assertEqual(poisoned['X-Cache'], 'MISS')
+
+        page = self.client.get(reverse('get_books'), {'limit': 1})
+        self.assertEqual(page['X-Cache'], 'HIT')
+        next_link = page.json()['next']
+        self.assertTrue(next_link.startswith('?'))
+        self.assertNotIn('evil.example', next_link)
+        self.assertNotIn('utm_source', next_link)
+        self.assertEqual(parse_qs(next_link[1:])['limit'], ['1'])
+
+    def test_page_size_is_capped(self):
+        for index in range(3):
+            self.create_course(index, lessons=1)
+        with mock.patch('services.pagination.CatalogCursorPagination.max_page_size', 2):
+            page = self.client.get(reverse('get_courses'), {'limit': 50}).json()
+        self.assertEqual(len(page['results']), 2)
+        self.assertEqual(page['results'][0]['modules_count'], 1)
+
+    def test_unpaginated_shape_is_unchanged(self):
+        self.create_book()
+        self.assertIsInstance(self.client.get(reverse('get_books')).json(), list)
+
+
+class SparseFieldsetTests(CatalogTestCase):
+    def test_fields_narrow_output_and_columns(self):
+        self.create_book()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('get_books'), {'fields': 'title,cover_image,price'})
+
+        self.assertEqual(set(response.json()[0]), {'title', 'cover_image', 'price'})
+        select = captured[0]['sql'].split(' FROM ')[0]
+        self.assertIn('"cover_image"', select)
+        self.assertNotIn('"description"', select)
+        self.assertNotIn('"what_readers_will_learn"', select)
+
+    def test_omit_defers_columns(self):
+        self.create_course(1, lessons=3)
+        with CaptureQueriesContext(connection) as captured:
+            course = self.client.get(reverse('get_courses'), {'omit': 'description'}).json()[0]
+
+        self.assertNotIn('description', course)
+        self.assertEqual(course['modules_count'], 3)
+        self.assertNotIn('"description"', captured[0]['sql'].split(' FROM ')[0])
+
+    def test_variants_are_cached_separately(self):
+        self.create_book()
+        narrow = self.client.get(reverse('get_books'), {'fields': 'title'})
+        full = self.client.get(reverse('get_books'))
+        self.assertEqual(set(narrow.json()[0]), {'title'})
+        self.assertIn('description', full.json()[0])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('get_books'), {'fields': 'title,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['fields'])
+
+
+@override_settings(CATALOG_FAST_SERIALIZATION=True)
+class FastSerializationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        book = self.create_book('Fast & "quoted"')
+        book.what_readers_will_learn = ['One', {'nested': True}]
+        book.ideal_for = None
+        book.price = '12.50'
+        book.save()
+        self.create_book('Second')
+        self.create_course(1, lessons=3)
+        self.create_course(2, lessons=0)
+
+    def assert_same_bytes(self, url, params=None):
+        fast = self.client.get(url, params or {}).content
+        caches['default'].clear()
+        with override_settings(CATALOG_FAST_SERIALIZATION=False):
+            slow = self.client.get(url, params or {}).content
+        self.assertEqual(fast, slow)
+
+    def test_book_list_is_byte_identical(self):
+        self.assert_same_bytes(reverse('get_books'))
+
+    def test_course_list_is_byte_identical(self):
+        self.assert_same_bytes(reverse('get_courses'))
+
+    def test_sparse_and_paginated_variants_are_byte_identical(self):
+        self.assert_same_bytes(reverse('get_books'), {'fields': 'title,price,created_at', 'limit': 1})
+        self.assert_same_bytes(reverse('get_courses'), {'omit': 'description', 'limit': 1})
+
+
+class ORJSONRendererTests(TestCase):
+    def test_output_matches_stock_renderer(self):
+        data = {
+            'price': Decimal('12.50'),
+            'amount': Decimal('1000.00'),
+            'created_at': datetime(2025, 10, 30, 17, 12, 5, 123456, tzinfo=dt_timezone.utc),
+            'date': date(2025, 10, 30),
+            'title': 'Zion – “NGO” guide ✓\u2028\u2029',
+            'nested': [{'a': None, 'b': True, 'c': 1.5}],
+            1: 'int key',
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indented_requests_fall_back_to_stock_renderer(self):
+        data = {'a': [1, 2]}
+        self.assertEqual(
+            ORJSONRenderer().render(data, 'application/json; indent=4'),
+            JSONRenderer().render(data, 'application/json; indent=4'),
+        )
+
+    def test_parser(self):
+        parsed = ORJSONParser().parse(BytesIO('{"name": "Zion ✓", "qty": 2}'.encode()))
+        self.assertEqual(parsed, {'name': 'Zion ✓', 'qty': 2})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"amount": NaN}'))
+
+
+class PrecompressedCatalogTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_book('Compressible ' * 20)
+        self.identity = self.client.get(reverse('get_books')).content
+
+    def test_gzip_variant(self):
+        response = self.client.get(reverse('get_books'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), self.identity)
+
+    def test_brotli_preferred_when_accepted(self):
+        response = self.client.get(reverse('get_books'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.identity)
+
+    def test_q_zero_excludes_an_encoding(self):
+        response = self.client.get(reverse('get_books'), HTTP_ACCEPT_ENCODING='br;q=0, gzip;q=0.5')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_hits_do_no_compression_work(self):
+        with mock.patch('gzip.compress') as compress:
+            response = self.client.get(reverse('get_books'), HTTP_ACCEPT_ENCODING='gzip')
+        compress.assert_not_called()
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_each_encoding_has_its_own_etag(self):
+        plain = self.client.get(reverse('get_books'))
+        gzipped = self.client.get(reverse('get_books'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotEqual(plain['ETag'], gzipped['ETag'])
+        self.assertNotIn('Content-Encoding', plain)
+
+
+class CatalogSnapshotTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.output = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output.cleanup)
+        self.book = self.create_book()
+        self.course = self.create_course(0, lessons=2)
+        self.other = self.create_course(1, lessons=1)
+
+    def manifest(self):
+        return catalog_snapshot.load_manifest(self.output.name)
+
+    def read(self, path):
+        with open(f"{self.output.name}/{self.manifest()['files'][path]['file']}", 'rb') as f:
+            return f.read()
+
+    def test_first_run_writes_every_file_matching_the_api(self):
+        rebuilt, removed = catalog_snapshot.export_snapshot(self.output.name)
+        self.assertEqual(len(rebuilt), 4)
+        self.assertEqual(removed, [])
+        self.assertEqual(self.read('/api/books/'), self.client.get(reverse('get_books')).content)
+        self.assertEqual(self.read('/api/courses/'), self.client.get(reverse('get_courses')).content)
+        detail = json.loads(self.read(catalog_snapshot.course_path(self.course.id)))
+        self.assertEqual([lesson['title'] for lesson in detail['lessons']], ['Lesson 1', 'Lesson 2'])
+        self.assertEqual(
+            self.read(catalog_snapshot.course_path(self.course.id)),
+            self.client.get(reverse('course-detail', args=[self.course.id])).content,
+        )
+
+    def test_no_file_contains_an_access_code_or_video_url(self):
+        catalog_snapshot.export_snapshot(self.output.name)
+        for path in self.manifest()['files']:
+            body = self.read(path)
+            self.assertNotIn(b'access_code', body)
+            self.assertNotIn(b'CODE0', body)
+            self.assertNotIn(b'CODE1', body)
+            self.assertNotIn(b'video_url', body)
+
+    def test_unchanged_rows_are_not_rebuilt(self):
+        catalog_snapshot.export_snapshot(self.output.name)
+        with self.assertNumQueries(3):
+            self.assertEqual(catalog_snapshot.export_snapshot(self.output.name), ([], []))
+        self.assertEqual(self.manifest()['version'], 1)
+
+    def test_lesson_edit_rebuilds_only_its_course_detail(self):
+        catalog_snapshot.export_snapshot(self.output.name)
+        old_file = self.manifest()['files'][catalog_snapshot.course_path(self.course.id)]['file']
+        CourseLesson.objects.filter(course=self.course, order=1).update(title='Renamed')
+
+        rebuilt, _ = catalog_snapshot.export_snapshot(self.output.name)
+        self.assertEqual(rebuilt, [catalog_snapshot.course_path(self.course.id)])
+        self.assertEqual(self.manifest()['version'], 2)
+        self.assertIn(b'Renamed', self.read(catalog_snapshot.course_path(self.course.id)))
+        # The superseded version is cleaned up
+        self.assertFalse(os.path.exists(f"{self.output.name}/{old_file}"))
+
+    def test_deleted_course_is_removed(self):
+        catalog_snapshot.export_snapshot(self.output.name)
+        path = catalog_snapshot.course_path(self.other.id)
+        old_file = self.manifest()['files'][path]['file']
+        self.other.delete()
+
+        rebuilt, removed = catalog_snapshot.export_snapshot(self.output.name)
+        self.assertEqual(rebuilt, ['/api/courses/'])
+        self.assertEqual(removed, [path])
+        self.assertNotIn(path, self.manifest()['files'])
+        self.assertFalse(os.path.exists(f"{self.output.name}/{old_file}"))
+
+    def test_admin_save_triggers_incremental_rebuild(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin_user)
+        catalog_snapshot.export_snapshot(self.output.name)
+
+        with override_settings(CATALOG_SNAPSHOT_DIR=self.output.name, CATALOG_SNAPSHOT_ON_ADMIN_SAVE=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse('admin:services_book_change', args=[self.book.pk]),
+                    {'title': 'New title', 'description': 'About', 'cover_image': 'https://example.com/cover.png',
+                     'price': '10.00', 'bundle_eligible': 'on'},
+                )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.manifest()['version'], 2)
+        self.assertIn(b'New title', self.read('/api/books/'))
+
+
+class CatalogBundleTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_book()
+        for index in range(3):
+            self.create_course(index, lessons=index + 1)
+
+    def test_bundle_matches_the_list_endpoints_in_two_queries(self):
+        with self.assertNumQueries(2):
+            bundle = self.client.get(reverse('catalog-bundle')).json()
+        self.assertEqual(bundle['books'], self.client.get(reverse('get_books')).json())
+        self.assertEqual(bundle['courses'], self.client.get(reverse('get_courses')).json())
+        self.assertEqual(bundle['version'], catalog_cache.catalog_version()[0])
+        self.assertEqual(sorted(course['modules_count'] for course in bundle['courses']), [1, 2, 3])
+
+    def test_bundle_is_cached_and_revalidated(self):
+        first = self.client.get(reverse('catalog-bundle'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('catalog-bundle'))['X-Cache'], 'HIT')
+            not_modified = self.client.get(reverse('catalog-bundle'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_catalog_edit_refreshes_bundle(self):
+        first = self.client.get(reverse('catalog-bundle'))
+        self.create_book('Second book')
+        second = self.client.get(reverse('catalog-bundle'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(len(second.json()['books']), 2)
+        self.assertGreater(second.json()['version'], first.json()['version'])
+
+
+class CourseDetailCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.create_course(0, lessons=2)
+        self.other = self.create_course(1, lessons=1)
+        self.url = reverse('course-detail', args=[self.course.id])
+
+    def access(self, course_id, code):
+        return self.client.post(reverse('access-course'), {'course_id': course_id, 'access_code': code}, content_type='application/json')
+
+    def test_string_course_ids_are_routed(self):
+        self.assertTrue(self.url.endswith(f'/courses/{self.course.id}/'))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['lessons']), 2)
+
+    def test_public_detail_hides_the_access_code_and_lesson_content(self):
+        detail = self.client.get(self.url).json()
+        self.assertNotIn('access_code', detail)
+        for lesson in detail['lessons']:
+            self.assertEqual(set(lesson), {'id', 'title', 'order'})
+        self.assertNotIn(b'CODE0', self.client.get(self.url).content)
+
+        unlocked = self.access(self.course.id, 'CODE0').json()
+        self.assertEqual(unlocked['access_code'], 'CODE0')
+        self.assertEqual(unlocked['lessons'][0]['video_url'], 'https://example.com/v')
+
+    def test_other_courses_changes_keep_the_cached_detail(self):
+        first = self.client.get(self.url)
+        self.other.title = 'Renamed'
+        self.other.save()
+        self.create_book()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_lesson_change_retires_the_detail(self):
+        first = self.client.get(self.url)
+        with self.committed():
+            CourseLesson.objects.create(course=self.course, title='Extra', video_url='https://example.com/v', order=3)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['lessons']), 3)
+
+    def test_unknown_ids_are_negatively_cached(self):
+        url = reverse('course-detail', args=['COURSE-NOPE0000'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 404)
+            self.assertEqual(self.access('COURSE-NOPE0000', 'CODE').status_code, 404)
+            self.assertEqual(self.client.get(reverse('course-detail', args=['X' * 40])).status_code, 404)
+
+    def test_creating_the_course_clears_the_negative_entry(self):
+        url = reverse('course-detail', args=['COURSE-LATER000'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with self.committed():
+            Course.objects.create(
+                id='COURSE-LATER000', title='Later', description='About', duration='1 week', price='5.00',
+                thumbnail='https://example.com/thumb.png', what_you_learn=[], access_code='LATER',
+            )
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_access_course_is_served_from_cache(self):
+        self.assertEqual(self.access(self.course.id, 'CODE0').status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.access(self.course.id, 'CODE0')
+            wrong = self.access(self.course.id, 'WRONG')
+        self.assertEqual(len(response.json()['lessons']), 2)
+        self.assertEqual(wrong.status_code, 403)
+
+    def test_access_code_change_takes_effect(self):
+        self.access(self.course.id, 'CODE0')
+        self.course.access_code = 'NEWCODE'
+        with self.committed():
+            self.course.save()
+        self.assertEqual(self.access(self.course.id, 'CODE0').status_code, 403)
+        self.assertEqual(self.access(self.course.id, 'NEWCODE').status_code, 200)
+
+
+class SingleFlightTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        self.builds = 0
+
+    def build(self, delay=0.0, payload=None):
+        def build():
+            self.builds += 1
+            time.sleep(delay)
+            return payload or {'builds': self.builds}
+        return build
+
+    def get(self, build):
+        return catalog_cache.cached_response(self.factory.get('/api/books/'), 'books', build)
+
+    def lock_key(self):
+        return f"catalog:books:v{catalog_cache.catalog_version()[0]}:lock"
+
+    def test_concurrent_misses_in_one_process_build_once(self):
+        build = self.build(delay=0.2)
+        responses = []
+        threads = [threading.Thread(target=lambda: responses.append(self.get(build))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.builds, 1)
+        self.assertEqual({response.content for response in responses}, {b'{"builds":1}'})
+        outcomes = [response['X-Cache'] for response in responses]
+        self.assertEqual(outcomes.count('MISS'), 1)
+        # Threads that arrived after the store are plain hits
+        self.assertTrue(set(outcomes) <= {'MISS', 'COALESCED', 'HIT'})
+
+    def test_stale_version_is_served_while_another_process_rebuilds(self):
+        old = self.get(self.build())
+        catalog_cache.bump_catalog_version()
+        caches['default'].add(self.lock_key(), True)
+
+        response = self.get(self.build())
+        self.assertEqual(response['X-Cache'], 'STALE')
+        self.assertEqual(response.content, old.content)
+        self.assertEqual(response['ETag'], old['ETag'])
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.builds, 1)
+
+    def test_waits_for_another_process_without_stale_copy(self):
+        caches['default'].add(self.lock_key(), True)
+        key = f"catalog:books:v{catalog_cache.catalog_version()[0]}:identity"
+        threading.Timer(0.1, lambda: caches['default'].set(key, b'{"from":"other"}')).start()
+
+        response = self.get(self.build())
+        self.assertEqual(response['X-Cache'], 'COALESCED')
+        self.assertEqual(response.content, b'{"from":"other"}')
+        self.assertEqual(self.builds, 0)
+
+    def test_builds_itself_when_the_lock_holder_never_delivers(self):
+        caches['default'].add(self.lock_key(), True)
+        with mock.patch.object(catalog_cache, 'REBUILD_WAIT_SECONDS', 0.1):
+            response = self.get(self.build())
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(self.builds, 1)
+
+    def test_failed_build_releases_the_lock(self):
+        def broken():
+            raise Course.DoesNotExist
+        with self.assertRaises(Course.DoesNotExist):
+            self.get(broken)
+        self.assertIsNone(caches['default'].get(self.lock_key()))
+        self.assertEqual(self.get(self.build())['X-Cache'], 'MISS')
+
+
+class CourseAccessTokenTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.create_course(0, lessons=1)
+        self.other = self.create_course(1, lessons=1)
+
+    def access(self, data, **headers):
+        return self.client.post(reverse('access-course'), data, content_type='application/json', **headers)
+
+    def unlock(self):
+        response = self.access({'course_id': self.course.id, 'access_code': 'CODE0'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['access_token']
+
+    def test_access_code_unlock_returns_a_token(self):
+        response = self.access({'course_id': self.course.id, 'access_code': 'CODE0'}).json()
+        self.assertTrue(course_access.verify_token(response['access_token'], self.course.id))
+        self.assertEqual(response['access_token_expires_in'], 7200)
+        self.assertEqual(response['title'], 'Course 0')
+
+    def test_token_unlocks_without_the_code_or_a_query(self):
+        token = self.unlock()
+        with self.assertNumQueries(0):
+            by_header = self.access({'course_id': self.course.id}, HTTP_X_COURSE_TOKEN=token)
+            by_body = self.access({'course_id': self.course.id, 'access_token': token})
+        self.assertEqual((by_header.status_code, by_body.status_code), (200, 200))
+        self.assertEqual(by_header.json()['id'], self.course.id)
+
+    def test_token_is_bound_to_its_course(self):
+        token = self.unlock()
+        self.assertFalse(course_access.verify_token(token, self.other.id))
+        self.assertEqual(self.access({'course_id': self.other.id, 'access_token': token}).status_code, 403)
+
+    def test_tampered_and_expired_tokens_are_rejected(self):
+        token = self.unlock()
+        self.assertFalse(course_access.verify_token(token[:-1] + ('A' if token[-1] != 'A' else 'B'), self.course.id))
+        with override_settings(COURSE_ACCESS_TOKEN_MAX_AGE=-1):
+            self.assertFalse(course_access.verify_token(token, self.course.id))
+
+    def test_bad_token_falls_back_to_the_access_code(self):
+        response = self.access({'course_id': self.course.id, 'access_code': 'CODE0', 'access_token': 'garbage'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_codes_are_compared_in_constant_time(self):
+        with mock.patch('services.course_access.constant_time_compare', return_value=False) as compare:
+            response = self.access({'course_id': self.course.id, 'access_code': 'CODE0'})
+        self.assertEqual(response.status_code, 403)
+        compare.assert_called_once_with('CODE0', 'CODE0')
+
+
+class LessonOutlineTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.create_course(0, lessons=3)
+        self.token = course_access.make_token(self.course.id)
+
+    def test_outline_has_titles_and_order_only(self):
+        with self.assertNumQueries(1):
+            outline = self.client.get(reverse('course-outline', args=[self.course.id])).json()
+        self.assertEqual(outline['course_id'], self.course.id)
+        self.assertEqual([lesson['order'] for lesson in outline['lessons']], [1, 2, 3])
+        self.assertEqual(set(outline['lessons'][0]), {'id', 'title', 'order'})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('course-outline', args=[self.course.id]))['X-Cache'], 'HIT')
+
+    def test_outline_follows_lesson_changes_and_unknown_courses_404(self):
+        self.client.get(reverse('course-outline', args=[self.course.id]))
+        with self.committed():
+            CourseLesson.objects.filter(course=self.course, order=3).delete()
+        self.assertEqual(len(self.client.get(reverse('course-outline', args=[self.course.id])).json()['lessons']), 2)
+        self.assertEqual(self.client.get(reverse('course-outline', args=['COURSE-NOPE0000'])).status_code, 404)
+
+    def lesson_url(self, lesson, course=None):
+        return reverse('course-lesson', args=[(course or self.course).id, lesson.pk])
+
+    def test_outline_uses_the_course_order_index(self):
+        plan = CourseLesson.objects.filter(course_id=self.course.id).order_by('order').explain()
+        self.assertIn('lesson_course_order_idx', plan)
+
+    def test_lesson_requires_a_token_for_that_course(self):
+        url = self.lesson_url(self.course.lessons.get(order=2))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        other_token = course_access.make_token('COURSE-OTHER000')
+        self.assertEqual(self.client.get(url, HTTP_X_COURSE_TOKEN=other_token).status_code, 403)
+
+    def test_lesson_is_served_with_one_query(self):
+        url = self.lesson_url(self.course.lessons.get(order=2))
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_X_COURSE_TOKEN=self.token)
+        self.assertEqual(response.json()['title'], 'Lesson 2')
+        self.assertEqual(response.json()['video_url'], 'https://example.com/v')
+        self.assertTrue(response['Cache-Control'].startswith('private'))
+
+        missing = self.client.get(reverse('course-lesson', args=[self.course.id, 999999]), HTTP_X_COURSE_TOKEN=self.token)
+        self.assertEqual(missing.status_code, 404)
+
+    def test_lessons_sharing_an_order_are_each_reachable(self):
+        course = self.create_course(1, lessons=0)
+        with self.committed():
+            for title in ('First', 'Second', 'Third'):
+                CourseLesson.objects.create(course=course, title=title, video_url=f'https://example.com/{title}')
+        token = course_access.make_token(course.id)
+
+        outline = self.client.get(reverse('course-outline', args=[course.id])).json()['lessons']
+        self.assertEqual([lesson['order'] for lesson in outline], [1, 1, 1])
+        titles = [
+            self.client.get(reverse('course-lesson', args=[course.id, lesson['id']]), HTTP_X_COURSE_TOKEN=token).json()['title']
+            for lesson in outline
+        ]
+        self.assertEqual(titles, ['First', 'Second', 'Third'])
+
+    def test_lesson_of_another_course_is_not_served(self):
+        other = self.create_course(1, lessons=1)
+        response = self.client.get(self.lesson_url(other.lessons.get(), course=self.course), HTTP_X_COURSE_TOKEN=self.token)
+        self.assertEqual(response.status_code, 404)
+
+
+class AccessCourseThrottleTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = self.create_course(0, lessons=1)
+
+    def guess(self, course_id=None, code='WRONG', ip='10.0.0.1', **data):
+        return self.client.post(
+            reverse('access-course'), {'course_id': course_id or self.course.id, 'access_code': code, **data},
+            content_type='application/json', REMOTE_ADDR=ip,
+        )
+
+    def test_excess_guesses_from_one_ip_are_rejected_before_the_orm(self):
+        for _ in range(10):
+            self.assertEqual(self.guess().status_code, 403)
+        with self.assertNumQueries(0):
+            response = self.guess(code='CODE0')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # Other clients are unaffected
+        self.assertEqual(self.guess(code='CODE0', ip='10.0.0.2').status_code, 200)
+
+    def test_guesses_spread_over_ips_hit_the_per_course_limit(self):
+        for index in range(30):
+            self.guess(ip=f'10.0.1.{index}')
+        self.assertEqual(self.guess(ip='10.0.2.1').status_code, 429)
+        other = self.create_course(1, lessons=1)
+        self.assertEqual(self.guess(course_id=other.id, code='CODE1', ip='10.0.2.1').status_code, 200)
+
+    def test_one_throttled_ip_does_not_use_up_the_course_budget(self):
+        statuses = [self.guess().status_code for _ in range(40)]
+        self.assertEqual(statuses.count(403), 10)
+        self.assertEqual(statuses.count(429), 30)
+        # Rejected attempts were not charged to the course, so other students still get in
+        self.assertEqual(self.guess(code='CODE0', ip='10.0.0.2').status_code, 200)
+        for index in range(19):
+            self.guess(ip=f'10.0.3.{index}')
+        self.assertEqual(self.guess(ip='10.0.4.1').status_code, 429)
+
+    def test_shared_counter_limits_across_workers(self):
+        for _ in range(10):
+            self.guess()
+        # A fresh worker has empty buckets but sees the shared counter
+        throttling.reset_buckets()
+        self.assertEqual(self.guess().status_code, 429)
+
+    def test_token_holders_are_not_throttled(self):
+        token = course_access.make_token(self.course.id)
+        for _ in range(15):
+            response = self.guess(code=None, access_token=token)
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_bucket_refills(self):
+        bucket = throttling.TokenBucket(capacity=2, duration=10)
+        self.assertEqual([bucket.consume('k', 0), bucket.consume('k', 0)], [0, 0])
+        self.assertAlmostEqual(bucket.consume('k', 0), 5.0)
+        self.assertEqual(bucket.consume('k', 5.0), 0)
+
+
+class PublicFormGuardTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.contact = {'name': 'Ada', 'email': 'ada@example.com', 'subject': 'Hello', 'message': 'Hi there'}
+
+    def post(self, url_name, data, ip='10.0.0.1'):
+        return self.client.post(reverse(url_name), data, content_type='application/json', REMOTE_ADDR=ip)
+
+    def test_valid_submission_is_saved(self):
+        self.assertEqual(self.post('contact-message', self.contact).status_code, 201)
+        self.assertEqual(ContactMessage.objects.count(), 1)
+
+    def test_honeypot_is_accepted_silently_without_a_query(self):
+        with self.assertNumQueries(0):
+            response = self.post('contact-message', {**self.contact, 'website': 'http://spam.example'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ContactMessage.objects.count(), 0)
+
+    def test_duplicates_within_the_window_are_dropped_before_validation(self):
+        self.post('contact-message', self.contact)
+        shuffled = {'message': '  hi   THERE ', **{k: v for k, v in self.contact.items() if k != 'message'}}
+        with self.assertNumQueries(0), mock.patch.object(ContactMessageSerializer, 'is_valid') as is_valid:
+            response = self.post('contact-message', shuffled, ip='10.0.0.2')
+        is_valid.assert_not_called()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ContactMessage.objects.count(), 1)
+
+        self.post('contact-message', {**self.contact, 'message': 'Something else'})
+        self.assertEqual(ContactMessage.objects.count(), 2)
+
+    def test_invalid_submissions_still_report_errors_on_resubmit(self):
+        invalid = {**self.contact, 'email': 'not-an-email'}
+        self.assertEqual(self.post('contact-message', invalid).status_code, 400)
+        self.assertEqual(self.post('contact-message', invalid).status_code, 400)
+
+    def test_ip_window_is_shared_by_the_three_forms(self):
+        for index in range(10):
+            self.post('contact-message', {**self.contact, 'message': f'Message {index}'})
+        with self.assertNumQueries(0):
+            response = self.post('invite-speaker', {'full_name': 'Bot'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.post('book-strategy-call', {'full_name': 'Bot'}).status_code, 429)
+        self.assertEqual(self.post('contact-message', {**self.contact, 'message': 'New'}, ip='10.0.0.9').status_code, 201)
+
+    def test_spoofed_forwarded_for_does_not_reset_the_window(self):
+        def flood(forwarded_for):
+            return [
+                self.client.post(
+                    reverse('contact-message'), {**self.contact, 'message': f'Message {index}'},
+                    content_type='application/json', REMOTE_ADDR='10.0.0.1',
+                    HTTP_X_FORWARDED_FOR=forwarded_for.format(index=index),
+                ).status_code
+                for index in range(11)
+            ]
+
+        self.assertEqual(flood('203.0.113.{index}')[-1], 429)
+
+        # Behind one proxy, only the address that proxy appended counts
+        caches['default'].clear()
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            self.assertEqual(flood('203.0.113.{index}, 198.51.100.7')[-1], 429)
+
+
+class CreatePaymentIdempotencyTests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title='Book', description='About', cover_image='https://example.com/cover.png', price='10.00')
+        self.data = {'payment_type': 'book', 'item_id': self.book.id, 'qty': 1, 'full_name': 'Ada', 'email': 'ada@example.com'}
+        sessions = iter(range(1, 100))
+        patcher = mock.patch(
+            'services.views.create_stripe_checkout_session',
+            side_effect=lambda **kwargs: mock.Mock(id=f'cs_test_{next(sessions)}', url='https://checkout.example/cs'),
+        )
+        self.create_session = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def pay(self, key=None, data=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post(reverse('create-payment'), data or self.data, content_type='application/json', **headers)
+
+    def test_retries_replay_the_first_response(self):
+        first = self.pay('key-1')
+        second = self.pay('key-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((second.status_code, second.json()), (201, first.json()))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Payment.objects.count(), 1)
+        self.create_session.assert_called_once()
+        self.assertEqual(self.create_session.call_args.kwargs['idempotency_key'], 'create-payment:key-1')
+
+    def test_scoped_key_fits_stripes_length_limit(self):
+        longest = 'k' * (idempotency.MAX_KEY_LENGTH - len('create-payment:'))
+        self.assertEqual(self.pay(longest).status_code, 201)
+        self.assertEqual(len(self.create_session.call_args.kwargs['idempotency_key']), 255)
+
+        response = self.pay(longest + 'k')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Idempotency-Key is too long.'})
+        self.create_session.assert_called_once()
+
+    def test_without_a_key_every_request_creates_a_payment(self):
+        self.pay()
+        self.pay()
+        self.assertEqual(Payment.objects.count(), 2)
+        self.assertIsNone(self.create_session.call_args.kwargs['idempotency_key'])
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.pay('key-1')
+        response = self.pay('key-1', {**self.data, 'qty': 3})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_duplicate_waits_for_the_in_flight_request(self):
+        record = IdempotencyKey.objects.create(key='create-payment:key-1', request_fingerprint=idempotency.fingerprint(self.data))
+
+        def finish(seconds):
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status='completed', response_status=201, response_body={'checkout_url': 'https://checkout.example/first'}
+            )
+
+        with mock.patch('services.idempotency.time.sleep', side_effect=finish) as sleep:
+            response = self.pay('key-1')
+        sleep.assert_called_once()
+        self.assertEqual(response.json(), {'checkout_url': 'https://checkout.example/first'})
+        self.create_session.assert_not_called()
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_duplicate_gets_409_while_the_original_is_still_running(self):
+        IdempotencyKey.objects.create(key='create-payment:key-1', request_fingerprint=idempotency.fingerprint(self.data))
+        response = self.pay('key-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_key_left_processing_by_a_dead_worker_is_taken_over(self):
+        stale = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_PROCESSING_TIMEOUT + 1)
+        record = IdempotencyKey.objects.create(key='create-payment:key-1', request_fingerprint=idempotency.fingerprint(self.data))
+        IdempotencyKey.objects.filter(pk=record.pk).update(created_at=stale)
+
+        self.assertEqual(self.pay('key-1', {**self.data, 'qty': 3}).status_code, 422)
+        response = self.pay('key-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.create_session.call_args.kwargs['idempotency_key'], 'create-payment:key-1')
+        self.assertEqual(IdempotencyKey.objects.get().status, 'completed')
+
+        # The dead worker's lease is gone, so a late write from it changes nothing
+        record.created_at = stale
+        self.assertEqual(idempotency.owned(record).delete()[0], 0)
+        self.assertEqual(self.pay('key-1').json(), response.json())
+
+    def test_failures_are_not_stored(self):
+        self.create_session.side_effect = stripe.APIConnectionError('Stripe is down')
+        self.assertEqual(self.pay('key-1').status_code, 400)
+        self.create_session.side_effect = lambda **kwargs: mock.Mock(id='cs_test_ok', url='https://checkout.example/cs')
+        self.assertEqual(self.pay('key-1').status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get().status, 'completed')
+
+    def test_session_replayed_by_stripe_does_not_duplicate_the_payment(self):
+        self.create_session.side_effect = lambda **kwargs: mock.Mock(id='cs_test_same', url='https://checkout.example/cs')
+        self.pay('key-1')
+        IdempotencyKey.objects.all().delete()  # our record was lost, Stripe still has the key
+        self.assertEqual(self.pay('key-1').status_code, 201)
+        self.assertEqual(Payment.objects.filter(payment_id='cs_test_same').count(), 1)
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for api.stripe.com / stripe-mock: creates Checkout Sessions."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+        self.server.requests.append({
+            'path': self.path,
+            'headers': dict(self.headers),
+            'params': parse_qs(body),
+            'connection': self.client_address,
+        })
+        time.sleep(self.server.delay)
+        code = self.server.responses.pop(0) if self.server.responses else 200
+        if code == 200:
+            payload = self.create_or_update(self.path, len(self.server.requests))
+        else:
+            payload = {'error': {'type': 'api_error', 'message': 'Something went wrong'}}
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out and hung up
+
+    def create_or_update(self, path, number):
+        parts = path.strip('/').split('/')  # v1/<resource>[/<id>]
+        if parts[1:] == ['checkout', 'sessions']:
+            return {'id': f'cs_test_{number}', 'object': 'checkout.session', 'url': 'https://checkout.example/cs'}
+        prefix = {'products': 'prod', 'prices': 'price'}[parts[1]]
+        return {'id': parts[2] if len(parts) > 2 else f'{prefix}_{number}', 'object': prefix}
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeStripeServer(FakeSendGridServer):
+    def __init__(self):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeStripeHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.requests = []
+        self.httpd.responses = []
+        self.httpd.delay = 0
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __exit__(self, *exc):
+        stripe_client.reset_client()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeStripeTestCase(TestCase):
+    def setUp(self):
+        self.server = FakeStripeServer()
+        self.stripe = self.server.__enter__()
+        self.addCleanup(self.server.__exit__)
+        settings_override = override_settings(
+            STRIPE_API_BASE=self.server.url, STRIPE_SECRET_KEY='sk_test_123', STRIPE_MAX_NETWORK_RETRIES=0,
+            STRIPE_READ_TIMEOUT=0.3, STRIPE_BREAKER_FAILURE_THRESHOLD=2, STRIPE_BREAKER_RESET_SECONDS=60,
+            STRIPE_CONCURRENCY_WAIT_SECONDS=0.05, SITE_URL='https://example.com',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        stripe_client.reset_client()
+        self.book = Book.objects.create(title='Book', description='About', cover_image='https://example.com/cover.png', price='10.00')
+
+    def pay(self, qty=1, **headers):
+        data = {'payment_type': 'book', 'item_id': self.book.id, 'qty': qty, 'full_name': 'Ada', 'email': 'ada@example.com'}
+        return self.client.post(reverse('create-payment'), data, content_type='application/json', **headers)
+
+    def stripe_calls(self, path):
+        return [request for request in self.stripe.requests if request['path'] == path]
+
+
+class StripeClientTests(FakeStripeTestCase):
+    def test_checkout_goes_through_the_pooled_client(self):
+        self.assertEqual(self.pay(HTTP_IDEMPOTENCY_KEY='key-1').status_code, 201)
+        self.assertEqual(self.pay().status_code, 201)
+
+        first, second = self.stripe_calls('/v1/checkout/sessions')
+        self.assertEqual(first['headers']['Authorization'], 'Bearer sk_test_123')
+        self.assertEqual(first['headers']['Idempotency-Key'], 'create-payment:key-1')
+        self.assertEqual(first['params']['customer_email'], ['ada@example.com'])
+        # Keep-alive: every call reuses the first connection
+        self.assertEqual({request['connection'] for request in self.stripe.requests}, {first['connection']})
+        self.assertEqual(Payment.objects.get(payment_id=f"cs_test_{len(self.stripe.requests) - 1}").status, 'pending')
+
+    def test_timeouts_answer_503(self):
+        self.stripe.delay = 0.6
+        response = self.pay()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_breaker_opens_and_fails_fast(self):
+        self.stripe.responses = [500, 503]
+        self.assertEqual(self.pay().status_code, 503)
+        self.assertEqual(self.pay().status_code, 503)
+        payments = Payment.objects.count()
+
+        response = self.pay()
+        self.assertEqual(response.status_code, 503)
+        self.assertGreater(int(response['Retry-After']), 1)
+        # Open breaker: no call to Stripe and no Payment row
+        self.assertEqual(len(self.stripe.requests), 2)
+        self.assertEqual(Payment.objects.count(), payments)
+
+    def test_half_open_trial_closes_the_breaker(self):
+        self.stripe.responses = [500, 500]
+        self.pay()
+        self.pay()
+        breaker = stripe_client.get_breaker()
+        breaker.opened_at -= 61
+
+        self.assertEqual(self.pay().status_code, 201)
+        self.assertFalse(breaker.is_open)
+
+    def test_client_errors_do_not_trip_the_breaker(self):
+        self.stripe.responses = [400, 400, 400]
+        for _ in range(3):
+            self.assertEqual(self.pay().status_code, 400)
+        self.assertFalse(stripe_client.get_breaker().is_open)
+
+    def test_concurrency_limit_rejects_when_saturated(self):
+        with override_settings(STRIPE_MAX_CONCURRENT_CHECKOUTS=1):
+            stripe_client.reset_client()
+            stripe_client.get_breaker()
+            stripe_client._slots.acquire()
+            try:
+                response = self.pay()
+            finally:
+                stripe_client._slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.stripe.requests, [])
+
+
+class StripeCatalogSyncTests(FakeStripeTestCase):
+    def test_first_checkout_creates_product_and_price_once(self):
+        self.assertEqual(self.pay(qty=2).status_code, 201)
+        self.assertEqual(self.pay().status_code, 201)
+
+        product, = self.stripe_calls('/v1/products')
+        self.assertEqual(product['params']['name'], ['Book'])
+        self.assertEqual(product['headers']['Idempotency-Key'], f'catalog-product:book:{self.book.pk}')
+        price, = self.stripe_calls('/v1/prices')
+        self.assertEqual(price['params']['unit_amount'], ['1000'])
+
+        first, second = self.stripe_calls('/v1/checkout/sessions')
+        self.assertEqual(first['params']['line_items[0][price]'], ['price_2'])
+        self.assertEqual(first['params']['line_items[0][quantity]'], ['2'])
+        self.assertNotIn('line_items[0][price_data][unit_amount]', first['params'])
+        self.assertEqual(second['params']['line_items[0][quantity]'], ['1'])
+
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.stripe_product_id, self.book.stripe_price_id), ('prod_1', 'price_2'))
+
+    def test_price_change_creates_a_new_price_and_archives_the_old_one(self):
+        self.pay()
+        self.book.refresh_from_db()
+        self.book.price = Decimal('12.00')
+        self.book.save()
+        self.pay()
+
+        self.assertEqual(len(self.stripe_calls('/v1/products')), 1)
+        self.assertEqual([call['params']['unit_amount'] for call in self.stripe_calls('/v1/prices')], [['1000'], ['1200']])
+        archived, = self.stripe_calls('/v1/prices/price_2')
+        self.assertEqual(archived['params'], {'active': ['false']})
+
+    def test_title_change_only_renames_the_product(self):
+        self.pay()
+        self.book.refresh_from_db()
+        self.book.title = 'Second edition'
+        self.book.save()
+        self.pay()
+
+        renamed, = self.stripe_calls('/v1/products/prod_1')
+        self.assertEqual(renamed['params'], {'name': ['Second edition']})
+        self.assertEqual(len(self.stripe_calls('/v1/prices')), 1)
+
+    def test_sync_does_not_touch_catalog_caches_or_output(self):
+        version = catalog_cache.catalog_version()[0]
+        self.pay()
+        self.assertEqual(catalog_cache.catalog_version()[0], version)
+        self.assertFalse(any(name.startswith('stripe_') for name in self.client.get(reverse('get_books')).json()[0]))
+
+    def test_services_keep_ad_hoc_prices_with_their_own_name(self):
+        data = {'payment_type': 'service', 'item_name': 'NGO Setup', 'amount': 50, 'qty': 1, 'full_name': 'Ada', 'email': 'ada@example.com'}
+        self.assertEqual(self.client.post(reverse('create-payment'), data, content_type='application/json').status_code, 201)
+        session, = self.stripe_calls('/v1/checkout/sessions')
+        self.assertEqual(session['params']['line_items[0][price_data][product_data][name]'], ['NGO Setup'])
+        self.assertEqual(self.stripe_calls('/v1/products'), [])
@@ -0,0 +1,191 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+from .course_access import token_from_request, verify_token
+
+
+class TokenBucket:
+    """
+    In-process token bucket per key: refills at `capacity` tokens per `duration`
+    seconds, up to `capacity`. Costs a dict lookup, so abusive clients are turned
+    away without a cache round trip.
+    """
+
+    def __init__(self, capacity, duration, max_keys=10000):
+        self.capacity = capacity
+        self.rate = capacity / duration
+        self.max_keys = max_keys
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def consume(self, key, now):
+        """Take one token. Returns 0 when allowed, otherwise seconds until a token is available."""
+        with self.lock:
+            tokens, last = self.buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self.buckets[key] = (tokens, now)
+                return (1 - tokens) / self.rate
+
+            if len(self.buckets) >= self.max_keys and key not in self.buckets:
+                # Full buckets carry no state worth keeping; drop them to bound memory
+                self.buckets = {k: v for k, v in self.buckets.items() if v[0] + (now - v[1]) * self.rate < self.capacity}
+            self.buckets[key] = (tokens - 1, now)
+            return 0
+
+
+class BucketThrottle(SimpleRateThrottle):
+    """
+    Two-layer rate limit for the `scope` rate in DEFAULT_THROTTLE_RATES.
+
+    A per-process TokenBucket rejects bursts locally; requests it lets through are
+    counted in a fixed-window counter in the shared cache (atomic `incr`), which
+    enforces the limit across workers. Both layers run before the view, so rejected
+    requests never reach the ORM.
+    """
+    _buckets = {}
+    _buckets_lock = threading.Lock()
+
+    def bucket(self):
+        with self._buckets_lock:
+            bucket = self._buckets.get(self.scope)
+            if bucket is None:
+                bucket = self._buckets[self.scope] = TokenBucket(self.num_requests, self.duration)
+            return bucket
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        self._wait = self.bucket().consume(self.key, self.now)
+        if self._wait:
+            return False
+
+        window = int(self.now // self.duration)
+        counter_key = f"{self.key}_{window}"
+        self.cache.add(counter_key, 0, self.duration)
+        try:
+            count = self.cache.incr(counter_key)
+        except ValueError:  # evicted between add and incr
+            self.cache.set(counter_key, 1, self.duration)
+            count = 1
+
+        if count > self.num_requests:
+            self._wait = (window + 1) * self.duration - self.now
+            return False
+        return True
+
+    def wait(self):
+        return self._wait
+
+
+def reset_buckets():
+    """Forget the in-process buckets (tests, or after changing rates)."""
+    with BucketThrottle._buckets_lock:
+        BucketThrottle._buckets.clear()
+
+
+class AccessCourseThrottle(BucketThrottle):
+    """Base for the access_course limits; holders of a valid access token are not throttled."""
+
+    def course_id(self, request):
+        return str(request.data.get('course_id') or '')
+
+    def get_cache_key(self, request, view):
+        if verify_token(token_from_request(request), self.course_id(request)):
+            return None
+        ident = self.get_throttle_ident(request)
+        if not ident:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class AccessCourseIPThrottle(AccessCourseThrottle):
+    """Code guesses per client IP."""
+    scope = 'access_course_ip'
+
+    def get_throttle_ident(self, request):
+        return self.get_ident(request)
+
+
+class AccessCourseIDThrottle(AccessCourseThrottle):
+    """Code guesses per course, so spreading a guessing attack over many IPs does not help."""
+    scope = 'access_course'
+
+    def get_throttle_ident(self, request):
+        return self.course_id(request)[:40]
+
+
+class AccessCourseGuessThrottle(BaseThrottle):
+    """
+    Per-IP limit first, then the per-course limit. The course budget is only charged
+    for attempts the IP limit let through, so one flooding IP cannot use it up and
+    lock every other student out of the course.
+    """
+
+    def __init__(self):
+        self.throttles = [AccessCourseIPThrottle(), AccessCourseIDThrottle()]
+        self.rejected_by = None
+
+    def allow_request(self, request, view):
+        for throttle in self.throttles:
+            if not throttle.allow_request(request, view):
+                self.rejected_by = throttle
+                return False
+        return True
+
+    def wait(self):
+        return self.rejected_by.wait() if self.rejected_by else None
+
+
+# --- Public forms ---
+
+class PublicFormThrottle(SimpleRateThrottle):
+    """
+    Per-IP sliding window shared by the contact, strategy call and speaker
+    invitation forms (DRF's request-history throttle).
+    """
+    scope = 'public_forms'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+def honeypot_filled(request):
+    """The hidden honeypot field is left empty by people and filled in by most bots."""
+    return bool(str(request.data.get(settings.FORM_HONEYPOT_FIELD) or '').strip())
+
+
+def submission_key(form, data):
+    """
+    Content hash of a form submission, insensitive to case, whitespace and field order,
+    so resubmissions of the same message within the dedupe window are recognised.
+    """
+    normalized = sorted(
+        (name, ' '.join(str(value).split()).casefold())
+        for name, value in data.items()
+        if name != settings.FORM_HONEYPOT_FIELD
+    )
+    digest = hashlib.sha256(repr(normalized).encode()).hexdigest()
+    return f"form:{form}:{digest}"
+
+
+def seen_submission(key):
+    return default_cache.get(key) is not None
+
+
+def remember_submission(key):
+    """Claim a submission hash. False means an identical one got there first."""
+    return default_cache.add(key, True, settings.FORM_DEDUPE_SECONDS)
+
+
+def forget_submission(key):
+    default_cache.delete(key)
@@ -4,7 +4,11 @@ from .views import *
 urlpatterns = [
     path('books/',get_books, name='get_books'),
     path('courses/',get_courses, name='get_courses'),
-    path('courses/<int:course_id>/', course_detail, name='course-detail'),
+    path('courses/<str:course_id>/', course_detail, name='course-detail'),
+    path('courses/<str:course_id>/outline/', course_outline, name='course-outline'),
+    path('courses/<str:course_id>/lessons/<int:lesson_id>/', course_lesson, name='course-lesson'),
+    path('catalog/', catalog_bundle, name='catalog-bundle'),
+    path('catalog/cache-stats/', catalog_cache_stats, name='catalog-cache-stats'),
 
     path('contact/', create_contact_message, name='contact-message'),
     path('strategy-call/', book_strategy_call, name='book-strategy-call'),
@@ -3,31 +3,45 @@ from django.conf import settings
 import random
 import string
 
+from .stripe_client import create_checkout_session
+from .stripe_catalog import sync_item
+
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
-def create_stripe_checkout_session(amount, email, success_url, cancel_url):
+def create_stripe_checkout_session(amount, email, success_url, cancel_url, idempotency_key=None,
+                                   item=None, qty=1, item_name=None):
     """
     Create a Stripe Checkout Session.
     Amount should be in kobo/cents (smallest unit).
+    Books and courses (`item`) are charged through their synced Stripe Price, `qty` times;
+    services, which have no catalog row, send ad-hoc price_data for `amount` named `item_name`.
+    With `idempotency_key`, Stripe creates at most one session per key.
+    Goes through the shared Stripe client (timeouts, circuit breaker, concurrency
+    limit); raises StripeUnavailable when Stripe is down or saturated.
     """
-    session = stripe.checkout.Session.create(
-        payment_method_types=['card'],
-        line_items=[{
+    if item is not None:
+        line_item = {'price': sync_item(item), 'quantity': qty}
+    else:
+        line_item = {
             'price_data': {
                 'currency': 'usd',
                 'unit_amount': int(amount * 100),  # Stripe expects amount in cents
                 'product_data': {
-                    'name': 'Consultation Payment',
+                    'name': item_name or 'Consultation Payment',
                 },
             },
             'quantity': 1,
-        }],
-        mode='payment',
-        customer_email=email,
-        success_url=success_url,
-        cancel_url=cancel_url,
-    )
+        }
+
+    session = create_checkout_session({
+        'payment_method_types': ['card'],
+        'line_items': [line_item],
+        'mode': 'payment',
+        'customer_email': email,
+        'success_url': success_url,
+        'cancel_url': cancel_url,
+    }, idempotency_key=idempotency_key)
     return session
 
 
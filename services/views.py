@@ -1,117 +1,319 @@
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 from django.conf import settings
-from .models import Book,Course,Payment
-from .serializers import BookSerializer,CourseSerializer,CourseDetailSerializer,ContactMessageSerializer,StrategyCallSerializer,SpeakerInvitationSerializer
+from .models import Book,Course,CourseLesson,Payment
+from .serializers import BookSerializer,CourseSerializer,CourseDetailSerializer,CoursePublicDetailSerializer,CourseLessonSerializer,CourseLessonOutlineSerializer,ContactMessageSerializer,StrategyCallSerializer,SpeakerInvitationSerializer,ValuesListSerializer,sparse_fieldset
 from .utils import create_stripe_checkout_session
+from .stripe_events import record_event
+from .idempotency import idempotent_response
+from .stripe_client import StripeUnavailable, check_available
+from .course_access import codes_match, make_token, verify_token, token_from_request
+from .throttling import AccessCourseGuessThrottle, PublicFormThrottle, honeypot_filled, submission_key, seen_submission, remember_submission, forget_submission
+from . import catalog_cache
+from .pagination import CatalogCursorPagination, pagination_requested, query_entry
+import json
 import stripe
 from django.views.decorators.csrf import csrf_exempt
 
 
+# Query parameters that change the shape of a catalog list response
+CATALOG_LIST_PARAMS = ('cursor', 'limit', 'fields', 'omit')
+
+
+def catalog_serializer(queryset, serializer_class, fields=None, omit=None):
+    """
+    Returns (queryset, serialize) for a catalog list.
+    With CATALOG_FAST_SERIALIZATION on, rows are serialized from `.values()`.
+    """
+    if settings.CATALOG_FAST_SERIALIZATION:
+        fast = ValuesListSerializer(serializer_class, fields=fields, omit=omit)
+        return fast.values(queryset), fast.to_representation
+
+    def serialize(rows):
+        return serializer_class(rows, many=True, fields=fields, omit=omit).data
+
+    return serializer_class.narrow_queryset(queryset, fields, omit), serialize
+
+
+def catalog_list_response(request, entry, queryset, serializer_class):
+    """
+    Shared body of the catalog list endpoints: sparse fieldsets, opt-in cursor
+    pagination, and caching with conditional GET for each variant.
+    """
+    fields, omit = sparse_fieldset(request, serializer_class)
+    queryset, serialize = catalog_serializer(queryset, serializer_class, fields, omit)
+
+    def build():
+        if pagination_requested(request):
+            return CatalogCursorPagination().paginated_data(queryset, request, serialize, CATALOG_LIST_PARAMS)
+        return serialize(queryset.order_by('-created_at'))
+
+    return catalog_cache.cached_response(request, query_entry(entry, request, CATALOG_LIST_PARAMS), build)
+
+
 @api_view(['GET'])
 def get_books(request):
     """
     Returns a list of all books in the database.
+    Supports `fields`/`omit` to trim columns and `limit`/`cursor` for keyset pages.
+    Served from the catalog cache with ETag/Last-Modified revalidation.
     """
-    books = Book.objects.all().order_by('-created_at')
-    serializer = BookSerializer(books, many=True)
-    return Response(serializer.data)
+    return catalog_list_response(request, catalog_cache.BOOKS, Book.objects.all(), BookSerializer)
 
 
 @api_view(['GET'])
 def get_courses(request):
     """
     Returns a summarized list of all courses.
+    Supports `fields`/`omit` to trim columns and `limit`/`cursor` for keyset pages.
+    Served from the catalog cache with ETag/Last-Modified revalidation.
     """
-    courses = Course.objects.all().order_by('-created_at')
-    serializer = CourseSerializer(courses, many=True, context={'request': request})
-    return Response(serializer.data)
+    return catalog_list_response(request, catalog_cache.COURSES, Course.objects.with_lessons_count(), CourseSerializer)
+
+
+@api_view(['GET'])
+def catalog_bundle(request):
+    """
+    Books and courses (with lesson counts) in one response for the landing page,
+    plus the catalog version they were built from. Two queries on a cache miss.
+    Cached and revalidated like the list endpoints.
+    """
+    def build():
+        # Read after the cache key was chosen, so the body is never older than its key
+        version, _ = catalog_cache.catalog_version()
+        books, serialize_books = catalog_serializer(Book.objects.all(), BookSerializer)
+        courses, serialize_courses = catalog_serializer(Course.objects.with_lessons_count(), CourseSerializer)
+        return {
+            'version': version,
+            'books': serialize_books(books.order_by('-created_at')),
+            'courses': serialize_courses(courses.order_by('-created_at')),
+        }
+
+    return catalog_cache.cached_response(request, catalog_cache.BUNDLE, build)
+
+
+def unknown_course(course_id):
+    """
+    Cheap rejection of course IDs that cannot exist (too long) or were recently
+    looked up and not found, before any cache entry is built for them.
+    """
+    return len(course_id) > Course._meta.pk.max_length or catalog_cache.course_missing(course_id)
 
 
 @api_view(['GET'])
 def course_detail(request, course_id):
-    try:
+    """
+    Public view of a course with its lesson outline, cached per course version with
+    ETag revalidation. The access code and video URLs are left out: those come from
+    access_course and the token-protected lesson endpoint.
+    Unknown IDs are remembered for CATALOG_MISSING_TIMEOUT so probes never reach the DB.
+    """
+    if unknown_course(course_id):
+        return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    def build():
         course = Course.objects.prefetch_related('lessons').get(id=course_id)
+        return CoursePublicDetailSerializer(course).data
+
+    try:
+        # Own entry name, so bodies cached before the access code was dropped are never served
+        return catalog_cache.cached_response(
+            request, f"{catalog_cache.course_entry(course_id)}:public", build, version=catalog_cache.course_version(course_id)
+        )
     except Course.DoesNotExist:
+        catalog_cache.mark_course_missing(course_id)
         return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
-    
-    serializer = CourseDetailSerializer(course)
-    return Response(serializer.data)
 
 
+@api_view(['GET'])
+def course_outline(request, course_id):
+    """
+    Lesson titles and order only, so large courses can render their player
+    without shipping every video URL. Cached per course version like course_detail.
+    """
+    if unknown_course(course_id):
+        return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    def build():
+        lessons = CourseLesson.objects.filter(course_id=course_id).order_by('order', 'id').values('id', 'title', 'order')
+        lessons = CourseLessonOutlineSerializer(lessons, many=True).data
+        # An empty outline needs one more query to tell "no lessons yet" from "no such course"
+        if not lessons and not Course.objects.filter(id=course_id).exists():
+            raise Course.DoesNotExist
+        return {'course_id': course_id, 'lessons': lessons}
 
-@api_view(['POST'])
-def create_contact_message(request):
-    serializer = ContactMessageSerializer(data=request.data)
-    if serializer.is_valid():
-        serializer.save()
-        return Response(
-            {"message": "Your message has been received successfully."},
-            status=status.HTTP_201_CREATED
+    try:
+        return catalog_cache.cached_response(
+            request, f"{catalog_cache.course_entry(course_id)}:outline", build, version=catalog_cache.course_version(course_id)
         )
+    except Course.DoesNotExist:
+        catalog_cache.mark_course_missing(course_id)
+        return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+
+
+@api_view(['GET'])
+def course_lesson(request, course_id, lesson_id):
+    """
+    A single lesson (video URL and resource) by the lesson id from the outline.
+    Positions are not unique (lessons added without one all share order 1), so they cannot identify a lesson.
+    Requires the access token from access_course in the X-Course-Token header.
+    """
+    if not verify_token(token_from_request(request), course_id):
+        return Response({'error': 'Invalid or expired access token.'}, status=status.HTTP_403_FORBIDDEN)
+
+    lesson = CourseLesson.objects.filter(course_id=course_id, pk=lesson_id).first()
+    if lesson is None:
+        return Response({'error': 'Lesson not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    response = Response(CourseLessonSerializer(lesson).data)
+    # Token-protected content must never be stored by shared caches
+    response['Cache-Control'] = 'private, max-age=300'
+    return response
+
+
+def cached_course_access(course_id):
+    """
+    (access_code, detail data) for access_course, cached per course version.
+    Returns None for unknown courses, and remembers them like course_detail does.
+    """
+    if unknown_course(course_id):
+        return None
+
+    cache = catalog_cache.get_cache()
+    version, _ = catalog_cache.course_version(course_id)
+    key = f"catalog:{catalog_cache.course_entry(course_id)}:access:v{version}"
+    cached = cache.get(key)
+    if cached is None:
+        try:
+            course = Course.objects.prefetch_related('lessons').get(id=course_id)
+        except Course.DoesNotExist:
+            catalog_cache.mark_course_missing(course_id)
+            return None
+        cached = (course.access_code, dict(CourseDetailSerializer(course).data))
+        cache.set(key, cached, settings.CATALOG_CACHE_TIMEOUT)
+    return cached
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def catalog_cache_stats(request):
+    """Hit/miss counters of the catalog cache in this worker process."""
+    return Response(catalog_cache.cache_stats())
+
+
+
+def public_form_submission(request, form, serializer_class, message):
+    """
+    Shared body of the public form endpoints, after the per-IP PublicFormThrottle.
+    Honeypot hits and repeats of a submission seen within FORM_DEDUPE_SECONDS get the
+    normal success reply, so bots learn nothing, but are never validated or written.
+    """
+    success = Response({"message": message}, status=status.HTTP_201_CREATED)
+    if honeypot_filled(request):
+        return success
+
+    key = submission_key(form, request.data)
+    if seen_submission(key):
+        return success
+
+    serializer = serializer_class(data=request.data)
+    if serializer.is_valid():
+        # Concurrent identical posts: only the first to claim the hash is saved
+        if remember_submission(key):
+            try:
+                serializer.save()
+            except Exception:
+                forget_submission(key)
+                raise
+        return success
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@throttle_classes([PublicFormThrottle])
+def create_contact_message(request):
+    return public_form_submission(
+        request, 'contact', ContactMessageSerializer, "Your message has been received successfully."
+    )
+
+
 
 @api_view(['POST'])
+@throttle_classes([PublicFormThrottle])
 def book_strategy_call(request):
-    serializer = StrategyCallSerializer(data=request.data)
-    if serializer.is_valid():
-        serializer.save()
-        return Response(
-            {"message": "Your strategy call has been booked successfully."},
-            status=status.HTTP_201_CREATED
-        )
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return public_form_submission(
+        request, 'strategy-call', StrategyCallSerializer, "Your strategy call has been booked successfully."
+    )
 
 
 
 @api_view(['POST'])
+@throttle_classes([PublicFormThrottle])
 def invite_speaker(request):
     """
     Endpoint to invite Mr. Zion to speak at an event.
     """
-    serializer = SpeakerInvitationSerializer(data=request.data)
-    if serializer.is_valid():
-        serializer.save()
-        return Response(
-            {"message": "Invitation request submitted successfully."},
-            status=status.HTTP_201_CREATED
-        )
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return public_form_submission(
+        request, 'invite-speaker', SpeakerInvitationSerializer, "Invitation request submitted successfully."
+    )
 
 
 
 @api_view(['POST'])
+@throttle_classes([AccessCourseGuessThrottle])
 def access_course(request):
+    """
+    Unlocks a course with its access code and returns the course with an
+    `access_token`. Later calls can send that token (X-Course-Token header or
+    `access_token` field) instead of the code; it is checked without touching the DB.
+    Code attempts are rate limited per IP and per course before any lookup.
+    """
     access_code = request.data.get('access_code')
     course_id = request.data.get('course_id')
+    token = token_from_request(request)
 
-    if not access_code or not course_id:
+    if not course_id or not (access_code or token):
         return Response(
             {"error": "Both course_id and access_code are required."},
             status=status.HTTP_400_BAD_REQUEST
         )
+    course_id = str(course_id)
+
+    # A valid token skips the access code check entirely
+    if token and verify_token(token, course_id):
+        course = cached_course_access(course_id)
+        if course is None:
+            return Response({"error": "Invalid course ID."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({**course[1], 'access_token': token}, status=status.HTTP_200_OK)
+
+    if not access_code:
+        return Response(
+            {"error": "Invalid or expired access token."},
+            status=status.HTTP_403_FORBIDDEN
+        )
 
     # Check if the course ID exists
-    try:
-        course = Course.objects.get(id=course_id)
-    except Course.DoesNotExist:
+    course = cached_course_access(course_id)
+    if course is None:
         return Response(
             {"error": "Invalid course ID."},
             status=status.HTTP_404_NOT_FOUND
         )
 
     # Check if the access code matches that course
-    if course.access_code != access_code:
+    course_access_code, course_data = course
+    if not codes_match(course_access_code, access_code):
         return Response(
             {"error": "Incorrect access code for this course."},
             status=status.HTTP_403_FORBIDDEN
         )
 
-    serializer = CourseDetailSerializer(course)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return Response(
+        {**course_data, 'access_token': make_token(course_id), 'access_token_expires_in': settings.COURSE_ACCESS_TOKEN_MAX_AGE},
+        status=status.HTTP_200_OK
+    )
 
 
 
@@ -122,8 +324,21 @@ def create_payment(request):
     Unified payment endpoint for services, books, and courses.
     - Books/Courses: item_id provided, lookup from DB
     - Services: frontend sends item_name and amount directly
+    Retries sent with the same `Idempotency-Key` header get the first response
+    back instead of a second Payment and Checkout Session.
+    """
+    return idempotent_response(request, 'create-payment', lambda key: start_checkout(request, key))
+
+
+def start_checkout(request, idempotency_key=None):
+    """
+    Creates the Payment row and its Stripe Checkout Session.
+    Answers 503 with Retry-After while Stripe is unavailable.
     """
     try:
+        # Fail fast while the Stripe circuit breaker is open, before writing anything
+        check_available()
+
         data = request.data
         payment_type = data.get('payment_type')  # "book", "course", or "service"
         full_name = data.get('full_name')
@@ -134,6 +349,7 @@ def create_payment(request):
         if not payment_type:
             return Response({'error': 'Payment type is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
+        item = None  # Book/Course row, charged through its synced Stripe Price
         item_name = None
         amount = None
         item_id = data.get('item_id', None)
@@ -190,13 +406,31 @@ def create_payment(request):
             email=email,
             success_url=success_url,
             cancel_url=cancel_url,
+            item=item,
+            qty=qty,
+            item_name=item_name,
+            # Stripe returns the same session for a repeated key, even if our own record was lost
+            idempotency_key=idempotency_key,
         )
 
-        payment.payment_id = session.id
-        payment.save()
+        if idempotency_key and Payment.objects.filter(payment_id=session.id).exists():
+            # A retry after a crash: the session already belongs to the first attempt's Payment
+            payment.delete()
+        else:
+            payment.payment_id = session.id
+            payment.save()
 
         return Response({'checkout_url': session.url}, status=status.HTTP_201_CREATED)
 
+    except StripeUnavailable as e:
+        print(f"⚠️ Checkout unavailable: {e}")
+        response = Response(
+            {'error': 'Payments are temporarily unavailable. Please try again shortly.'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        response['Retry-After'] = str(e.retry_after)
+        return response
+
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
@@ -217,38 +451,11 @@ def stripe_webhook(request):
     except ValueError:
         # Invalid payload
         return Response({'error': 'Invalid payload'}, status=status.HTTP_400_BAD_REQUEST)
-    except stripe.error.SignatureVerificationError:
+    except stripe.SignatureVerificationError:
         # Invalid signature
         return Response({'error': 'Invalid signature'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Handle successful checkout
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        payment_id = session.get('id')
-
-        payment = Payment.objects.filter(payment_id=payment_id).first()
-        if payment:
-            payment.status = 'success'
-            payment.save()
-            return Response({'message': 'Payment updated successfully'}, status=status.HTTP_200_OK)
-
-    # Handle payment failure
-    elif event['type'] == 'checkout.session.expired':
-        session = event['data']['object']
-        payment_id = session.get('id')
-
-        payment = Payment.objects.filter(payment_id=payment_id).first()
-        if payment:
-            payment.status = 'expired'
-            payment.save()
-
-    elif event['type'] == 'checkout.session.async_payment_failed':
-        session = event['data']['object']
-        payment_id = session.get('id')
-
-        payment = Payment.objects.filter(payment_id=payment_id).first()
-        if payment:
-            payment.status = 'failed'
-            payment.save()
-
-    return Response(status=status.HTTP_200_OK)
\ No newline at end of file
+    # Store the verified event and acknowledge straight away;
+    # `process_stripe_events` applies it to the payment asynchronously
+    record_event(json.loads(payload))
+    return Response(status=status.HTTP_200_OK)